@@ -0,0 +1,197 @@
+'''
+A vectorized engine that plays out thousands of scenarios at once.
+
+simulate.py steps one scenario forward at a time in plain Python, which is
+what dominates when generating verdicts for training and evaluation data. Here,
+N scenarios on canvases of the same size are held as NumPy arrays:
+
+  captured    - (N, H, W) whether each cell is captured (with a captured border around it)
+  building    - (N, 2, H, W) the cells being built by each of the line's two builders
+  builders    - (N, 2, 2) the (x, y) of each builder
+  steps       - (N, 2, 2) how each builder moves after a step in time
+  active      - (N, 2) whether each builder is still building
+  finished    - (N, 2) whether each builder has finished building
+  balls       - (N, B, 4) the (x, y, x_vel, y_vel) of each ball
+  ball_mask   - (N, B) which balls are there (scenarios can have fewer than B balls)
+
+and every scenario is stepped forward in lockstep, by the same rules as
+simulate(): balls move diagonally and bounce off captured cells and the
+border (see step_ball()), builders run until they hit a captured cell or the
+border, their cells are captured a step after they finish, and a ball on a
+building cell loses a life. A scenario's verdict can't change any more once it
+has lost a life or its line is done, so it is dropped from the arrays then, and
+the horizon doesn't need to be worked out up front.
+'''
+import argparse
+import random
+import time
+
+import numpy as np
+
+from simulate import BUILDER_STEPS, ORIENTATION_BUILDERS, random_scenario, simulate
+
+
+class Scenarios:
+    '''
+    N scenarios on canvases of the same size, as arrays (see the module docstring)
+    '''
+    def __init__(self, cursor_orientations, cursor_positions, balls, ball_mask, canvases):
+        self.cursor_orientations = cursor_orientations
+        self.cursor_positions = cursor_positions
+        self.balls = balls
+        self.ball_mask = ball_mask
+        self.canvases = canvases
+
+    @classmethod
+    def from_lists(cls, scenarios):
+        '''
+        Packs a list of (cursor_orientation, cursor_position, balls, canvas) scenarios
+        '''
+        num_balls = max(len(balls) for _, _, balls, _ in scenarios)
+        balls = np.zeros((len(scenarios), num_balls, 4), dtype=np.int64)
+        ball_mask = np.zeros((len(scenarios), num_balls), dtype=bool)
+        for n, (_, _, scenario_balls, _) in enumerate(scenarios):
+            for b, (x, y, x_vel, y_vel) in enumerate(scenario_balls):
+                balls[n, b] = (x, y, 1 if x_vel > 0 else -1, 1 if y_vel > 0 else -1)
+                ball_mask[n, b] = True
+
+        return cls(np.array([orientation for orientation, _, _, _ in scenarios]),
+                   np.array([position for _, position, _, _ in scenarios], dtype=np.int64),
+                   balls, ball_mask,
+                   np.array([canvas for _, _, _, canvas in scenarios], dtype=bool))
+
+    def __len__(self):
+        return len(self.canvases)
+
+
+def lose_life(scenarios, max_build_time=None):
+    '''
+    Whether creating the line loses a life in each scenario, as an (N,) array. Without a
+    max_build_time, the scenarios are stepped forward until every line is done.
+    '''
+    num_scenarios, height, width = scenarios.canvases.shape
+    index = np.arange(num_scenarios)
+
+    # Captured cells, with a border of captured cells around them (past the canvas border
+    # acts the same as a captured cell), so that x and y are off by one
+    captured = np.ones((num_scenarios, height + 2, width + 2), dtype=bool)
+    captured[:, 1:-1, 1:-1] = scenarios.canvases
+
+    # Each scenario has two builders, moving away from the cursor in opposite directions
+    steps = np.array([[BUILDER_STEPS[d] for d in ORIENTATION_BUILDERS[orientation]]
+                      for orientation in ("H", "V")], dtype=np.int64)
+    steps = steps[(scenarios.cursor_orientations == "V").astype(np.int64)]
+    builders = np.repeat(scenarios.cursor_positions[:, None, :], 2, axis=1) + 1
+    building = np.zeros((num_scenarios, 2, height + 2, width + 2), dtype=bool)
+    building[index, 0, builders[:, 0, 1], builders[:, 0, 0]] = True
+    building[index, 1, builders[:, 1, 1], builders[:, 1, 0]] = True
+    active = np.ones((num_scenarios, 2), dtype=bool)
+    finished = np.zeros((num_scenarios, 2), dtype=bool)
+    # Builders whose cells have been captured (and cleared out of building)
+    cleared = np.zeros((num_scenarios, 2), dtype=bool)
+
+    x = scenarios.balls[:, :, 0] + 1
+    y = scenarios.balls[:, :, 1] + 1
+    x_vel = scenarios.balls[:, :, 2].copy()
+    y_vel = scenarios.balls[:, :, 3].copy()
+    stuck = np.zeros_like(scenarios.ball_mask)
+    ball_index = index[:, None]
+
+    ball_mask = scenarios.ball_mask
+
+    # The scenarios that are still being played out (by their index in scenarios)
+    rows = index
+    lose_life = np.zeros(num_scenarios, dtype=bool)
+    t = 0
+    while len(rows) and (max_build_time is None or t < max_build_time - 1):
+        # When a ball collides with a building cell, the player loses a life
+        on_building = building[ball_index, :, y, x].any(axis=-1)
+        hit = (on_building & ball_mask).any(axis=1)
+        lose_life[rows[hit]] = True
+
+        # A building cell turns into a captured cell once its builder is done
+        next_captured = captured.copy()
+        for d in range(2):
+            done = np.flatnonzero(finished[:, d] & ~cleared[:, d])
+            next_captured[done] |= building[done, d]
+
+        # A builder creates a building cell and moves to the next cell, or finishes
+        # building if it runs into a captured cell or the canvas border
+        building[finished & ~cleared] = False
+        cleared = finished.copy()
+        ahead = builders + steps
+        blocked = captured[index[:, None], ahead[:, :, 1], ahead[:, :, 0]]
+        next_finished = finished | (active & blocked)
+        moving = active & ~blocked
+        builders = np.where(moving[:, :, None], ahead, builders)
+        for d in range(2):
+            moved = np.flatnonzero(moving[:, d])
+            building[moved, d, builders[moved, d, 1], builders[moved, d, 0]] = True
+        active = moving
+
+        # Balls move diagonally to the next cell if that cell isn't captured, and then
+        # bounce off of any captured cell (or canvas border) they're moving towards
+        moved = ~next_captured[ball_index, y + y_vel, x + x_vel]
+        x = np.where(moved, x + x_vel, x)
+        y = np.where(moved, y + y_vel, y)
+        bounce_x = next_captured[ball_index, y, x + x_vel]
+        bounce_y = next_captured[ball_index, y + y_vel, x]
+        x_vel = np.where(bounce_x, -x_vel, x_vel)
+        y_vel = np.where(bounce_y, -y_vel, y_vel)
+
+        # A ball that hit a corner head on (and nothing else) bounces straight back
+        corner = stuck & ~(bounce_x | bounce_y)
+        x_vel = np.where(corner, -x_vel, x_vel)
+        y_vel = np.where(corner, -y_vel, y_vel)
+        stuck = ~moved
+
+        captured = next_captured
+        finished = next_finished
+        t += 1
+
+        # Scenarios that lost a life, or whose line is done, can't change their verdict
+        # any more, so they're dropped from the arrays
+        live = ~hit & ~cleared.all(axis=1)
+        if not live.all():
+            rows = rows[live]
+            captured, building, builders, steps = captured[live], building[live], builders[live], steps[live]
+            active, finished, cleared = active[live], finished[live], cleared[live]
+            x, y, x_vel, y_vel, stuck, ball_mask = x[live], y[live], x_vel[live], y_vel[live], stuck[live], ball_mask[live]
+            index = np.arange(len(rows))
+            ball_index = index[:, None]
+
+    return lose_life
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play out random scenarios in lockstep with NumPy, and check them against the simulation")
+    parser.add_argument("--scenarios", type=int, default=10000)
+    parser.add_argument("--width", type=int, default=27)
+    parser.add_argument("--height", type=int, default=19)
+    parser.add_argument("--balls", type=int, default=4)
+    parser.add_argument("--density", type=float, default=0.2, help="chance of each cell being captured")
+    parser.add_argument("--check", type=int, default=1000,
+                        help="number of the scenarios to also simulate one at a time (to check them and compare the throughput)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scenarios = [random_scenario(rng, args.width, args.height, args.balls, args.density) for _ in range(args.scenarios)]
+
+    start = time.perf_counter()
+    packed = Scenarios.from_lists(scenarios)
+    packing = time.perf_counter() - start
+    start = time.perf_counter()
+    verdicts = lose_life(packed)
+    elapsed = time.perf_counter() - start
+    print(f"{args.scenarios} scenarios in {elapsed:.3f}s ({args.scenarios / elapsed:.0f} scenarios/s, after {packing:.3f}s packing them into arrays)")
+
+    checked = scenarios[:args.check]
+    start = time.perf_counter()
+    simulated = [simulate(*scenario).lose_life for scenario in checked]
+    elapsed = time.perf_counter() - start
+    if checked:
+        print(f"Simulated {len(checked)} scenarios one at a time in {elapsed:.3f}s ({len(checked) / elapsed:.0f} scenarios/s)")
+
+    disagreements = sum(verdict != expected for verdict, expected in zip(verdicts, simulated))
+    print(f"{disagreements} of {len(checked)} scenarios disagree with the simulation")
@@ -0,0 +1,208 @@
+'''
+Benchmarks for building the JezzBall encoding in run.py.
+
+Each benchmark reports how long it took and the peak memory it allocated
+(measured with tracemalloc, so the times include its overhead).
+
+The --suite mode generates random scenarios across canvas sizes, numbers of
+balls, captured densities and horizons, and for each one records the number of
+propositions and constraints, how long encoding, compiling and solving took,
+and the peak memory. Every scenario runs in a fresh process, and the peak memory
+it allocated itself is measured with tracemalloc (RSS would also count the
+propositions that importing run.py builds for the canvas in inputs.py, and memory
+freed by then is reused), so its times include the same overhead. The results
+are written out as one JSON object per line.
+'''
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import run
+from inputs import CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS
+
+
+def measure(name, function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<40} {elapsed:8.2f}s {peak / 2**20:10.1f} MiB")
+    return result
+
+
+def clear_interned():
+    # Forgets the propositions that importing run.py interned, so that building them again
+    # is measured rather than looking them up
+    for value in vars(run).values():
+        if callable(value) and isinstance(getattr(value, "table", None), dict):
+            value.table.clear()
+
+
+def proposition_instances():
+    # The same propositions as the PROPOSITION INSTANCES block in run.py, built from scratch
+    clear_interned()
+    props = [run.CursorPosition(x, y) for x, y in run.canvas_cells()]
+    for t in range(run.MAX_BUILD_TIME):
+        for x, y in run.canvas_cells():
+            props.append(run.CapturedCell(x, y, t))
+            for d in run.DIRECTIONS:
+                props.append(run.BuildingCell(d, x, y, t))
+                props.append(run.Builder(d, x, y, t))
+            for b in range(len(run.BALLS)):
+                props.append(run.BallPosition(b, x, y, t))
+    return props
+
+
+def pruned_dynamics():
+    # theory(pruned=True) without the inputs and the cardinality constraints
+    # (bauhaus builds "at most k" out of every combination of k+1 propositions)
+    run.REACHABLE = run.find_reachable_states()
+    run.dynamics()
+    return run.E
+
+
+def print_cardinality_clauses():
+    for family, counts in run.CARDINALITY_CLAUSES.items():
+        clauses = sum(count for count, _ in counts)
+        bauhaus_clauses = sum(count for _, count in counts)
+        print(f"  {family + ' cardinality clauses':<38} {clauses:>12,} (bauhaus: {bauhaus_clauses:,})")
+
+
+def cardinality_benchmarks():
+    # Compares the clauses the cardinality constraints add against bauhaus' add_at_most_k,
+    # for the pruned theory and for the full theory on a smaller canvas
+    run.configure(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS)
+    measure("pruned theory", lambda: run.theory(pruned=True))
+    print_cardinality_clauses()
+
+    run.configure("H", (3, 3), [(1, 1, 1, 1), (6, 5, -1, 1)], [[0] * 8 for _ in range(8)])
+    measure("theory (8x8 canvas, 2 balls)", run.theory)
+    print_cardinality_clauses()
+
+
+def encoding_benchmarks():
+    run.configure(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS)
+    print(f"{run.CANV_CELLS_WIDTH}x{run.CANV_CELLS_HEIGHT} canvas, {len(run.BALLS)} balls, horizon {run.MAX_BUILD_TIME}")
+
+    measure("proposition instances", proposition_instances)
+    E = measure("pruned dynamics", pruned_dynamics)
+    measure("pruned dynamics compile", E.compile)
+
+
+########## SUITE ##########
+
+def run_scenario(params):
+    '''
+    Encodes, compiles and solves one random scenario, returning its measurements
+    (this is meant to run in a fresh process, see run_suite())
+    '''
+    import dimacs
+    from simulate import random_scenario, simulate
+
+    # Only what the scenario itself allocates is traced (not what importing run.py took)
+    tracemalloc.start()
+    rng = random.Random(params["seed"])
+    scenario = random_scenario(rng, params["width"], params["height"], params["balls"], params["density"])
+    run.configure(*scenario, params["horizon"])
+    result = dict(params, time_steps=run.MAX_BUILD_TIME)
+
+    if params["backend"] == "dimacs":
+        # Writing the DIMACS file takes the place of compiling
+        with tempfile.TemporaryDirectory() as directory:
+            cnf_path = os.path.join(directory, "theory.cnf")
+            with open(cnf_path, "w") as cnf, open(cnf_path + ".vars", "w") as variables:
+                start = time.perf_counter()
+                writer = dimacs.write_dimacs(cnf, variables, params["pruned"])
+                result["encode_time"] = time.perf_counter() - start
+            result["compile_time"] = 0.0
+            result["propositions"] = len(writer.ids)
+            result["constraints"] = writer.clauses
+
+            start = time.perf_counter()
+            with open(cnf_path + ".vars") as variables:
+                solution = dimacs.solve(cnf_path, dimacs.read_variables(variables))
+            result["solve_time"] = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        E = run.theory(params["pruned"])
+        result["encode_time"] = time.perf_counter() - start
+        result["constraints"] = run.constraint_count()
+
+        start = time.perf_counter()
+        T = E.compile()
+        result["compile_time"] = time.perf_counter() - start
+        result["propositions"] = len(T.vars())
+
+        start = time.perf_counter()
+        solution = T.solve()
+        result["solve_time"] = time.perf_counter() - start
+
+    verdict = solution[run.LoseLife(run.MAX_BUILD_TIME - 1)]
+    result["lose_life"] = verdict
+    result["agrees_with_simulation"] = verdict == simulate(*scenario, params["horizon"]).lose_life
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["peak_memory_mib"] = peak / 2**20
+    return result
+
+
+def run_suite(sizes, balls, densities, horizons, repeats=1, pruned=False, backend="bauhaus", seed=0):
+    '''
+    Runs every combination of the parameters (a horizon of None is however long the line takes),
+    yielding the measurements for each scenario as it finishes
+    '''
+    rng = random.Random(seed)
+    suite = [dict(width=width, height=height, balls=num_balls, density=density, horizon=horizon,
+                  pruned=pruned, backend=backend, seed=rng.randrange(2**32))
+             for (width, height), num_balls, density, horizon, _ in itertools.product(sizes, balls, densities, horizons, range(repeats))]
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        yield from pool.imap(run_scenario, suite)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark building the encoding with the inputs from inputs.py, or across random scenarios with --suite")
+    parser.add_argument("--suite", action="store_true",
+                        help="benchmark random scenarios for every combination of the parameters below")
+    parser.add_argument("--sizes", default="4x4,6x6,8x8", help="comma separated WIDTHxHEIGHT canvas sizes")
+    parser.add_argument("--balls", default="1,2", help="comma separated numbers of balls")
+    parser.add_argument("--densities", default="0.2", help="comma separated fractions of captured cells")
+    parser.add_argument("--horizons", default="adaptive",
+                        help="comma separated horizons (adaptive = however long each line takes to be done)")
+    parser.add_argument("--repeats", type=int, default=1, help="number of scenarios for each combination")
+    parser.add_argument("--pruned", action="store_true", help="only encode the states that are reachable from the inputs")
+    parser.add_argument("--backend", choices=("bauhaus", "dimacs"), default="bauhaus",
+                        help="compile with bauhaus and solve with nnf, or stream DIMACS and solve with kissat")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", metavar="FILE", help="write the results here instead of stdout (JSON lines)")
+    args = parser.parse_args()
+
+    if not args.suite:
+        encoding_benchmarks()
+        cardinality_benchmarks()
+        sys.exit()
+
+    sizes = [tuple(map(int, size.split("x"))) for size in args.sizes.split(",")]
+    balls = [int(num_balls) for num_balls in args.balls.split(",")]
+    densities = [float(density) for density in args.densities.split(",")]
+    horizons = [None if horizon == "adaptive" else int(horizon) for horizon in args.horizons.split(",")]
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for result in run_suite(sizes, balls, densities, horizons, args.repeats, args.pruned, args.backend, args.seed):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if args.output:
+            out.close()
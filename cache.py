@@ -0,0 +1,244 @@
+'''
+A content-addressed cache of verdicts and compiled theories.
+
+The same board states get asked about over and over (replays, retries, the
+same canvas with the cursor moved), and every one of them used to build and
+compile the theory again. A TheoryCache keys each query by a hash of its
+canonical inputs, and keeps the verdicts (and optionally the compiled theories)
+in two tiers:
+
+  memory - the most recently used entries, up to a number of entries
+  disk   - pickled entries in an SQLite database in a directory, evicting the
+           least recently used ones once they take up more than a number of bytes
+
+Only the signs of the velocities matter, and the balls don't interact with each
+other, so the inputs are canonicalized before they are hashed: velocities
+become +1/-1 and the balls are sorted. The horizon is worked out up front, so
+queries that leave it out share entries with ones that pass it in.
+'''
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+
+from inputs import CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS
+from simulate import check_velocities, line_horizon
+
+
+def canonical_inputs(cursor_orientation, cursor_position, balls, canvas, max_build_time=None):
+    '''
+    The inputs in a canonical form: inputs that give the same verdict (and that compile
+    into the same theory) have the same canonical form
+    '''
+    check_velocities(balls)
+    if max_build_time is None:
+        max_build_time = line_horizon(cursor_orientation, cursor_position, canvas)
+    balls = sorted((x, y, 1 if x_vel > 0 else -1, 1 if y_vel > 0 else -1) for x, y, x_vel, y_vel in balls)
+    canvas = [[int(cell == 1) for cell in row] for row in canvas]
+    return cursor_orientation, tuple(cursor_position), balls, canvas, max_build_time
+
+
+def cache_key(kind, cursor_orientation, cursor_position, balls, canvas, max_build_time=None):
+    '''
+    A hash of the canonical inputs, for an entry of the given kind (e.g. "verdict")
+    '''
+    inputs = canonical_inputs(cursor_orientation, cursor_position, balls, canvas, max_build_time)
+    return hashlib.sha256(json.dumps([kind, *inputs], separators=(",", ":")).encode()).hexdigest()
+
+
+class MemoryTier:
+    '''
+    The most recently used entries, up to max_entries of them
+    '''
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class DiskTier:
+    '''
+    Pickled entries in one SQLite database in a directory, evicting the least recently
+    used ones once they take up more than max_bytes. The size and the last use of every
+    entry are kept in memory (and only read from the database when it's opened), so
+    neither a hit nor a put has to look at the other entries.
+    '''
+    # Roughly what SQLite stores for a row on top of its key and value
+    ROW_OVERHEAD = 16
+
+    def __init__(self, directory, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, "cache.sqlite"))
+        # Committing a put doesn't wait for the disk (the cache can lose its latest entries in a crash)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, last_used INTEGER)")
+        # The size of every entry, from the least to the most recently used
+        self.sizes = OrderedDict()
+        for key, size in self.db.execute("SELECT key, length(key) + length(value) FROM entries ORDER BY last_used"):
+            self.sizes[key] = size + self.ROW_OVERHEAD
+        self.total = sum(self.sizes.values())
+        self.clock = self.db.execute("SELECT COALESCE(MAX(last_used), 0) FROM entries").fetchone()[0]
+        self.evict()
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    def get(self, key):
+        if key not in self.sizes:
+            return None
+        row = self.db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            # Evicted by another process sharing the directory
+            self.total -= self.sizes.pop(key)
+            return None
+        with self.db:
+            self.db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (self.tick(), key))
+        self.sizes.move_to_end(key)
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, data, self.tick()))
+        size = len(key) + len(data) + self.ROW_OVERHEAD
+        self.total += size - self.sizes.pop(key, 0)
+        self.sizes[key] = size
+        self.evict()
+
+    def evict(self):
+        evicted = []
+        while self.total > self.max_bytes and self.sizes:
+            key, size = self.sizes.popitem(last=False)
+            self.total -= size
+            evicted.append((key,))
+        if evicted:
+            with self.db:
+                self.db.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def close(self):
+        self.db.close()
+
+
+class TheoryCache:
+    '''
+    Verdicts (and, with theories=True, compiled theories) for inputs, looked up in memory
+    first, then on disk (if there's a directory), and only built and solved on a miss
+    '''
+    def __init__(self, directory=None, max_entries=1024, max_bytes=256 * 2**20, theories=False, pruned=False):
+        self.memory = MemoryTier(max_entries)
+        self.disk = DiskTier(directory, max_bytes) if directory is not None else None
+        self.theories = theories
+        self.pruned = pruned
+        # The hits and misses for each kind of entry ("verdict" and "theory")
+        self.stats = {}
+
+    def get(self, kind, key, build):
+        '''
+        The entry of the given kind for key, calling build() to make it on a miss
+        '''
+        stats = self.stats.setdefault(kind, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+
+        value = self.memory.get(key)
+        if value is not None:
+            stats["memory_hits"] += 1
+            return value
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                stats["disk_hits"] += 1
+                self.memory.put(key, value)
+                return value
+
+        stats["misses"] += 1
+        value = build()
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+        return value
+
+    def compiled_theory(self, cursor_orientation, cursor_position, balls, canvas, max_build_time=None):
+        '''
+        The compiled theory for the (canonical) inputs
+        '''
+        import run
+
+        inputs = canonical_inputs(cursor_orientation, cursor_position, balls, canvas, max_build_time)
+
+        def build():
+            run.configure(*inputs)
+            return run.theory(self.pruned).compile()
+
+        if not self.theories:
+            return build()
+        return self.get("theory", cache_key(f"theory-pruned={self.pruned}", *inputs), build)
+
+    def lose_life(self, cursor_orientation=CURSOR_ORIENTATION, cursor_position=CURSOR_POSITION, balls=BALLS,
+                  canvas=CANVAS, max_build_time=None):
+        '''
+        Whether creating a line with these inputs loses a life
+        '''
+        import run
+
+        inputs = canonical_inputs(cursor_orientation, cursor_position, balls, canvas, max_build_time)
+
+        def build():
+            T = self.compiled_theory(*inputs)
+            return T.solve()[run.LoseLife(inputs[-1] - 1)]
+
+        return self.get("verdict", cache_key("verdict", *inputs), build)
+
+    def hit_rate(self, kind="verdict"):
+        stats = self.stats.get(kind, {})
+        lookups = sum(stats.values())
+        return (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+
+
+if __name__ == "__main__":
+    from simulate import random_scenario, simulate
+
+    parser = argparse.ArgumentParser(description="Answer random queries (drawn from a smaller set of board states, like replays and retries) through the cache, and check them against the simulation")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--states", type=int, default=20, help="number of distinct board states the queries are drawn from")
+    parser.add_argument("--width", type=int, default=5)
+    parser.add_argument("--height", type=int, default=5)
+    parser.add_argument("--balls", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--directory", help="where to keep the on-disk tier (by default, there's only the memory tier)")
+    parser.add_argument("--max-entries", type=int, default=1024, help="number of entries the memory tier holds")
+    parser.add_argument("--max-bytes", type=int, default=256 * 2**20, help="size the on-disk tier is evicted down to")
+    parser.add_argument("--theories", action="store_true", help="also cache the compiled theories")
+    parser.add_argument("--pruned", action="store_true", help="only encode the states that are reachable from the inputs")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    states = [random_scenario(rng, args.width, args.height, args.balls) for _ in range(args.states)]
+    scenarios = [rng.choice(states) for _ in range(args.queries)]
+
+    cache = TheoryCache(args.directory, args.max_entries, args.max_bytes, args.theories, args.pruned)
+    start = time.perf_counter()
+    verdicts = [cache.lose_life(*scenario) for scenario in scenarios]
+    elapsed = time.perf_counter() - start
+
+    disagreements = sum(verdict != simulate(*scenario).lose_life for scenario, verdict in zip(scenarios, verdicts))
+    print(f"{args.queries} queries in {elapsed:.2f}s, {cache.hit_rate():.0%} verdict hits {cache.stats}")
+    print(f"{disagreements} of {args.queries} queries disagree with the simulation")
@@ -0,0 +1,274 @@
+'''
+A long-running service that answers a stream of game frames.
+
+Each frame is a JSON object on its own line, with the same inputs as inputs.py:
+
+  {"id": 7, "cursor_orientation": "H", "cursor_position": [3, 2],
+   "balls": [[1, 1, 1, 1], ...], "canvas": [[1, 0, ...], ...]}
+
+(plus an optional "max_build_time"), read from stdin or from connections to a
+Unix socket. For every frame, a JSON line with its verdict and how long it took
+is written back: {"id": 7, "lose_life": false, "latency_ms": 0.4}. A velocity
+can be null if it's uncertain, and then the chance of losing a life (with even
+odds for each uncertain velocity, simulating every way they could be) is
+written back instead: {"id": 7, "probability": 0.25, "latency_ms": 1.2}.
+
+Everything is imported (and with --warm, the SAT sessions are built) before the
+first frame comes in, and state carries over from one frame to the next. Balls
+move deterministically and only notice a line once part of it is captured, so
+while the canvas stays the same, the trajectory worked out for an earlier frame
+is followed forward instead of being simulated again. Verdicts are remembered
+by their canonical inputs (see cache.py). If frames come in faster than they
+can be answered, only the newest waiting frame is answered and the rest are
+dropped as stale ({"id": 5, "dropped": true}), unless --no-drop is given. The
+answered and dropped frames, and the p50 and p99 latencies, are reported to
+stderr when the stream ends (and with --report-every, along the way).
+'''
+import argparse
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+from cache import MemoryTier, cache_key
+from simulate import ball_trajectory, line_horizon, longest_horizon, simulate
+
+
+def percentile(values, p):
+    # Nearest-rank percentile of a list of numbers
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))]
+
+
+class Daemon:
+    '''
+    Answers frames one after another, keeping what it can from one frame to the next
+    (with sat=True, each canvas size and number of balls gets an incremental SAT session)
+    '''
+    def __init__(self, sat=False, budget=0.05, drop_stale=True, report_every=None, max_entries=4096):
+        self.sat = sat
+        self.budget = budget
+        self.drop_stale = drop_stale
+        self.report_every = report_every
+        self.sessions = {}
+        self.verdicts = MemoryTier(max_entries)
+
+        # The trajectory of the balls (without a line) on the canvas of the last frame,
+        # and where in it the last frame's balls were
+        self.canvas = None
+        self.trajectory = []
+        self.offset = 0
+
+        self.latencies = []
+        self.dropped = 0
+        self.late = 0
+
+    def session(self, width, height, num_balls):
+        from incremental import Session
+
+        if (width, height, num_balls) not in self.sessions:
+            self.sessions[width, height, num_balls] = Session(width, height, num_balls)
+        return self.sessions[width, height, num_balls]
+
+    def ball_frames(self, balls, canvas, max_build_time):
+        '''
+        The trajectory of the balls for the next max_build_time steps, following the one
+        from earlier frames if the canvas hasn't changed and the balls are on it
+        '''
+        if canvas != self.canvas:
+            self.canvas = canvas
+            self.trajectory = []
+
+        def resumable(k):
+            # A ball that is stuck in a corner at step k bounces differently than
+            # one that starts there, so the trajectory can't be picked up from there
+            return (self.trajectory[k] == balls and
+                    (k == 0 or all(ball[:2] != previous[:2] for ball, previous in zip(balls, self.trajectory[k - 1]))))
+
+        for k in range(self.offset, len(self.trajectory) - max_build_time + 1):
+            if resumable(k):
+                self.offset = k
+                return self.trajectory[k:k + max_build_time]
+
+        # Simulated far enough ahead for the next few frames to be picked up from it
+        width, height = len(canvas[0]), len(canvas)
+        self.trajectory = ball_trajectory(balls, canvas, max(max_build_time, 4 * longest_horizon(width, height)))
+        self.offset = 0
+        return self.trajectory[:max_build_time]
+
+    def lose_life(self, frame):
+        cursor_orientation = frame["cursor_orientation"]
+        cursor_position = tuple(frame["cursor_position"])
+        balls = [(x, y, 1 if x_vel > 0 else -1, 1 if y_vel > 0 else -1) for x, y, x_vel, y_vel in frame["balls"]]
+        canvas = frame["canvas"]
+        max_build_time = frame.get("max_build_time") or line_horizon(cursor_orientation, cursor_position, canvas)
+
+        key = cache_key("verdict", cursor_orientation, cursor_position, balls, canvas, max_build_time)
+        verdict = self.verdicts.get(key)
+        if verdict is not None:
+            return verdict
+
+        if self.sat:
+            session = self.session(len(canvas[0]), len(canvas), len(balls))
+            verdict = session.lose_life(cursor_orientation, cursor_position, balls, canvas, max_build_time)
+        else:
+            ball_frames = self.ball_frames(balls, canvas, max_build_time)
+            verdict = simulate(cursor_orientation, cursor_position, balls, canvas, max_build_time, ball_frames).lose_life
+
+        self.verdicts.put(key, verdict)
+        return verdict
+
+    def probability(self, frame):
+        # The chance of losing a life for a frame with uncertain (null) velocities
+        from ddnnf import simulated_probability
+
+        return simulated_probability(frame["cursor_orientation"], tuple(frame["cursor_position"]),
+                                     [tuple(ball) for ball in frame["balls"]], frame["canvas"],
+                                     max_build_time=frame.get("max_build_time"))
+
+    def answer(self, received, line):
+        '''
+        The response to a frame (as a JSON line) that was received at time received
+        '''
+        frame = None
+        try:
+            frame = json.loads(line)
+            if any(velocity is None for ball in frame["balls"] for velocity in ball[2:]):
+                response = {"id": frame.get("id"), "probability": self.probability(frame)}
+            else:
+                response = {"id": frame.get("id"), "lose_life": self.lose_life(frame)}
+        except (ValueError, KeyError, TypeError, IndexError, AttributeError) as e:
+            response = {"id": frame.get("id") if isinstance(frame, dict) else None, "error": str(e)}
+
+        latency = time.perf_counter() - received
+        self.latencies.append(latency)
+        if latency > self.budget:
+            self.late += 1
+            response["late"] = True
+        response["latency_ms"] = round(latency * 1000, 3)
+
+        if self.report_every and len(self.latencies) % self.report_every == 0:
+            print(json.dumps(self.report()), file=sys.stderr, flush=True)
+        return response
+
+    def serve(self, lines, out):
+        '''
+        Answers the frames in lines (an iterable of JSON lines), writing the responses to out.
+        Frames are read in on another thread, so that ones that have been waiting behind a
+        newer frame by the time they'd be answered can be dropped (unless drop_stale is off).
+        '''
+        pending = []
+        done = threading.Event()
+        ready = threading.Condition()
+
+        def read():
+            for line in lines:
+                if line.strip():
+                    with ready:
+                        pending.append((time.perf_counter(), line))
+                        ready.notify()
+            with ready:
+                done.set()
+                ready.notify()
+
+        threading.Thread(target=read, daemon=True).start()
+
+        while True:
+            with ready:
+                ready.wait_for(lambda: pending or done.is_set())
+                if not pending:
+                    break
+                frames = pending[:]
+                pending.clear()
+
+            if not self.drop_stale:
+                for received, line in frames:
+                    out.write(json.dumps(self.answer(received, line)) + "\n")
+                out.flush()
+                continue
+
+            for _, line in frames[:-1]:
+                self.dropped += 1
+                try:
+                    stale_id = json.loads(line).get("id")
+                except (ValueError, AttributeError):
+                    stale_id = None
+                out.write(json.dumps({"id": stale_id, "dropped": True}) + "\n")
+            out.write(json.dumps(self.answer(*frames[-1])) + "\n")
+            out.flush()
+
+    def report(self):
+        '''
+        The number of frames answered and dropped, and the latency percentiles (in ms)
+        '''
+        report = {"answered": len(self.latencies), "dropped": self.dropped, "late": self.late}
+        if self.latencies:
+            for p in (50, 99):
+                report[f"p{p}_ms"] = round(percentile(self.latencies, p) * 1000, 3)
+        return report
+
+
+class FrameServer(socketserver.UnixStreamServer):
+    '''
+    Answers the frames from each connection to a Unix socket (one connection at a time)
+    with the same daemon, so its state carries over from one connection to the next
+    '''
+    def __init__(self, path, daemon):
+        super().__init__(path, FrameHandler)
+        self.frames = daemon
+
+
+class FrameHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.frames.serve(io.TextIOWrapper(self.rfile), io.TextIOWrapper(self.wfile, write_through=True))
+
+
+def warm_up(daemon, sizes):
+    # Imports everything and builds the SAT sessions up front, so the first frames aren't slow
+    import ddnnf
+    import run
+
+    for width, height, num_balls in sizes:
+        if daemon.sat:
+            daemon.session(width, height, num_balls)
+        canvas = [[0] * width for _ in range(height)]
+        frame = {"cursor_orientation": "H", "cursor_position": [0, 0], "balls": [[0, 0, 1, 1]] * num_balls, "canvas": canvas}
+        daemon.lose_life(frame)
+    daemon.verdicts = MemoryTier(daemon.verdicts.max_entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a stream of game frames (JSON lines) from stdin or a Unix socket")
+    parser.add_argument("--socket", metavar="PATH", help="listen on a Unix socket instead of reading stdin")
+    parser.add_argument("--sat", action="store_true",
+                        help="answer each frame with an incremental SAT session instead of simulating it")
+    parser.add_argument("--no-drop", action="store_true",
+                        help="answer every frame, even stale ones (e.g. to replay a recorded game)")
+    parser.add_argument("--budget", type=float, default=50, help="latency budget in ms (frames over it are marked late)")
+    parser.add_argument("--warm", default="", metavar="WxHxB,...",
+                        help="canvas sizes and numbers of balls to get ready for before reading frames")
+    parser.add_argument("--report-every", type=int, metavar="N",
+                        help="also report the latencies to stderr after every N answered frames")
+    args = parser.parse_args()
+
+    daemon = Daemon(args.sat, args.budget / 1000, not args.no_drop, args.report_every)
+    warm_up(daemon, [tuple(map(int, size.split("x"))) for size in args.warm.split(",") if size])
+
+    # Stopping the daemon still reports the latencies
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit())
+    try:
+        if args.socket:
+            if os.path.exists(args.socket):
+                os.remove(args.socket)
+            with FrameServer(args.socket, daemon) as server:
+                server.serve_forever()
+        else:
+            daemon.serve(sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(daemon.report()), file=sys.stderr, flush=True)
@@ -0,0 +1,446 @@
+'''
+Compile-once d-DNNF circuits for answering many queries on the same canvas.
+
+theory() bakes every input into the encoding, so each query is compiled (and
+solved) from scratch. Here, the dynamics for one canvas and number of balls are
+compiled once with DSHARP (see run.canvas_theory()), with the cursor and the
+balls' starting cells and velocities left free. A query is then answered by
+conditioning the circuit on its inputs, which takes one pass over the circuit.
+
+The circuit is evaluated as a weighted model count: leaves get the weight of
+their literal, and-nodes multiply and or-nodes add up their children. Every
+proposition other than the inputs is determined by the inputs, so only inputs
+can be missing from a branch of an or-node, and as long as the two weights of
+every input add up to 1 (0 and 1 for inputs that are conditioned on, or their
+probabilities), the circuit doesn't need to be smoothed. Conditioning on the
+inputs and on LoseLife, the count is above 0 if the line loses a life.
+
+Velocities that are uncertain (None) are weighed by their odds instead of
+conditioned on, which gives the chance of losing a life: the weighted count of
+the models that lose a life over that of all of them. compile_theory() compiles
+the theory for one set of inputs with only those velocities left free, which
+is feasible on full-size canvases (and a single compile, rather than one for
+each of the up to 4 ** len(balls) ways the velocities could be).
+
+The nodes are evaluated a level at a time with NumPy, for any number of queries
+at once, and compiled circuits are saved to .npz files, so the compile only has
+to be paid once per canvas.
+'''
+import argparse
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from simulate import line_horizon
+
+# The kinds of nodes
+LITERAL, AND, OR = 0, 1, 2
+
+
+def dsharp_binary():
+    here = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bin", "dsharp")
+    return here if os.path.exists(here) else "dsharp"
+
+
+def canvas_horizon(canvas):
+    '''
+    The horizon that is long enough for a line at any empty cell of the canvas
+    '''
+    return max(line_horizon(orientation, (x, y), canvas)
+               for orientation in ("H", "V")
+               for y in range(len(canvas))
+               for x in range(len(canvas[0]))
+               if canvas[y][x] == 0)
+
+
+def as_tuple(key):
+    # Keys come back from JSON with lists in place of tuples
+    return tuple(as_tuple(arg) if isinstance(arg, list) else arg for arg in key)
+
+
+class Circuit:
+    '''
+    A d-DNNF circuit, with its nodes in topological order (children before parents,
+    the root last):
+      kind      - LITERAL, AND or OR for each node
+      literal   - the DIMACS literal of each LITERAL node (0 for the others)
+      offsets   - where the children of each node start in edges (and end, for the last one)
+      edges     - the children of every node, one after another
+      level     - 0 for leaves, and 1 more than the highest child for the others
+      variables - the key of the proposition (see run.Hashable) for each variable id
+    along with the canvas, number of balls and horizon that it was compiled for
+    '''
+    def __init__(self, kind, literal, offsets, edges, level, variables, canvas, num_balls, max_build_time):
+        self.kind = kind
+        self.literal = literal
+        self.offsets = offsets
+        self.edges = edges
+        self.level = level
+        self.variables = variables
+        self.canvas = canvas
+        self.num_balls = num_balls
+        self.max_build_time = max_build_time
+        self.ids = {as_tuple(key): i for i, key in enumerate(variables, start=1) if key is not None}
+
+        # The and and or nodes with children at each level, with their edges laid out
+        # one after another (for np.multiply.reduceat() and np.add.reduceat())
+        self.levels = []
+        counts = np.diff(offsets)
+        for depth in range(1, int(level.max(initial=0)) + 1):
+            at_level = []
+            for node_kind in (AND, OR):
+                nodes = np.flatnonzero((level == depth) & (kind == node_kind) & (counts > 0))
+                if len(nodes) == 0:
+                    continue
+                node_edges = np.concatenate([edges[offsets[n]:offsets[n + 1]] for n in nodes])
+                starts = np.concatenate([[0], np.cumsum(counts[nodes])[:-1]])
+                at_level.append((node_kind, nodes, node_edges, starts))
+            self.levels.append(at_level)
+
+    @classmethod
+    def parse(cls, nnf, variables, canvas, num_balls, max_build_time):
+        '''
+        Reads in a circuit in DSHARP's -Fnnf format
+        '''
+        _, num_nodes, _, _ = nnf.readline().split()
+        num_nodes = int(num_nodes)
+
+        kind = np.zeros(num_nodes, dtype=np.int8)
+        literal = np.zeros(num_nodes, dtype=np.int32)
+        level = np.zeros(num_nodes, dtype=np.int32)
+        offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        edges = []
+        for n, line in enumerate(nnf):
+            spec = line.split()
+            if spec[0] == "L":
+                literal[n] = int(spec[1])
+                children = []
+            elif spec[0] == "A":
+                kind[n] = AND
+                children = [int(child) for child in spec[2:]]
+            elif spec[0] == "O":
+                kind[n] = OR
+                children = [int(child) for child in spec[3:]]
+            else:
+                raise ValueError(f"Can't parse line {n} of the circuit: {line}")
+            if children:
+                level[n] = 1 + max(level[child] for child in children)
+            edges.extend(children)
+            offsets[n + 1] = len(edges)
+
+        return cls(kind, literal, offsets, np.array(edges, dtype=np.int32), level,
+                   variables, canvas, num_balls, max_build_time)
+
+    def save(self, path):
+        np.savez_compressed(path, kind=self.kind, literal=self.literal, offsets=self.offsets, edges=self.edges,
+                            level=self.level, variables=json.dumps(self.variables),
+                            canvas=np.array(self.canvas, dtype=np.int8), num_balls=self.num_balls,
+                            max_build_time=self.max_build_time)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(arrays["kind"], arrays["literal"], arrays["offsets"], arrays["edges"], arrays["level"],
+                       json.loads(str(arrays["variables"])), arrays["canvas"].tolist(),
+                       int(arrays["num_balls"]), int(arrays["max_build_time"]))
+
+    def size(self):
+        return len(self.kind), len(self.edges)
+
+    def weighted_count(self, positive, negative):
+        '''
+        The weighted model count for each of a batch of queries, where positive[i] and
+        negative[i] are the weights (one for each query) of variable i being true and false
+        '''
+        # One row of values for each query, so that the children of a node are next to each other
+        values = np.ones((positive.shape[1], len(self.kind)))
+        leaves = self.kind == LITERAL
+        literals = self.literal[leaves]
+        values[:, leaves] = np.where(literals > 0, positive[np.abs(literals)].T, negative[np.abs(literals)].T)
+        # Or-nodes without children are false (and-nodes without children are true)
+        values[:, (self.kind == OR) & (np.diff(self.offsets) == 0)] = 0
+
+        for at_level in self.levels:
+            for node_kind, nodes, node_edges, starts in at_level:
+                reduce = np.multiply if node_kind == AND else np.add
+                values[:, nodes] = reduce.reduceat(values[:, node_edges], starts, axis=1)
+        return values[:, -1]
+
+    def weights(self, num_queries):
+        # Weights of 1 either way for every variable (ones that are conditioned on get 1 and 0)
+        return np.ones((len(self.variables) + 1, num_queries)), np.ones((len(self.variables) + 1, num_queries))
+
+    def weigh(self, positive, negative, q, key, p):
+        # Weighs the proposition with this key by the chance p that it's true, for query q
+        i = self.ids.get(key)
+        if i is not None:
+            positive[i, q] = p
+            negative[i, q] = 1 - p
+
+    def condition(self, positive, negative, q, key, value):
+        # Conditions query q on the proposition with this key having this value
+        self.weigh(positive, negative, q, key, float(value))
+
+    def condition_inputs(self, positive, negative, q, cursor_orientation, cursor_position, balls):
+        '''
+        Conditions query q on the cursor, and on the balls' starting cells and velocities
+        (a velocity of None is left free)
+        '''
+        if len(balls) != self.num_balls:
+            raise ValueError(f"This circuit is for {self.num_balls} balls")
+
+        self.condition(positive, negative, q, ("Horizontal",), cursor_orientation == "H")
+        self.condition(positive, negative, q, ("Vertical",), cursor_orientation == "V")
+        height, width = len(self.canvas), len(self.canvas[0])
+        for y in range(height):
+            for x in range(width):
+                self.condition(positive, negative, q, ("CursorPosition", x, y), (x, y) == tuple(cursor_position))
+                for b, (ball_x, ball_y, _, _) in enumerate(balls):
+                    self.condition(positive, negative, q, ("BallPosition", b, x, y, 0), (x, y) == (ball_x, ball_y))
+
+        for b, (_, _, x_vel, y_vel) in enumerate(balls):
+            if x_vel is not None:
+                self.condition(positive, negative, q, ("BallVelocityX", b, 0), x_vel > 0)
+            if y_vel is not None:
+                self.condition(positive, negative, q, ("BallVelocityY", b, 0), y_vel > 0)
+
+    def lose_life_batch(self, queries, chunk=4):
+        '''
+        Whether creating a line loses a life, for each of a list of (cursor_orientation,
+        cursor_position, balls) queries on the circuit's canvas, with one pass over the
+        circuit for every chunk of queries
+        '''
+        if len(queries) > chunk:
+            return [verdict for start in range(0, len(queries), chunk)
+                    for verdict in self.lose_life_batch(queries[start:start + chunk], chunk)]
+
+        positive, negative = self.weights(2 * len(queries))
+        verdict = ("LoseLife", self.max_build_time - 1)
+        for q, query in enumerate(queries):
+            # Each query is counted once as it is, and once where it loses a life
+            for column, lose_life in ((2 * q, None), (2 * q + 1, True)):
+                self.condition_inputs(positive, negative, column, *query)
+                if lose_life is not None:
+                    self.condition(positive, negative, column, verdict, lose_life)
+
+        counts = self.weighted_count(positive, negative)
+        if (counts[0::2] == 0).any():
+            raise ValueError("The inputs contradict the theory")
+        return list(counts[1::2] > 0)
+
+    def lose_life(self, cursor_orientation, cursor_position, balls):
+        return self.lose_life_batch([(cursor_orientation, cursor_position, balls)])[0]
+
+    def lose_life_probability(self, cursor_orientation, cursor_position, balls, odds=None):
+        '''
+        The chance of losing a life when the velocities that are None in balls are uncertain,
+        where odds[b] is (P(x_vel > 0), P(y_vel > 0)) for ball b (even odds by default).
+        Every way the velocities could be has exactly one model, so this is the weighted
+        count of the models that lose a life over that of all the models.
+        '''
+        positive, negative = self.weights(2)
+        for column in range(2):
+            self.condition_inputs(positive, negative, column, cursor_orientation, cursor_position, balls)
+            for b, (_, _, x_vel, y_vel) in enumerate(balls):
+                p_x, p_y = odds[b] if odds is not None else (0.5, 0.5)
+                if x_vel is None:
+                    self.weigh(positive, negative, column, ("BallVelocityX", b, 0), p_x)
+                if y_vel is None:
+                    self.weigh(positive, negative, column, ("BallVelocityY", b, 0), p_y)
+        self.condition(positive, negative, 1, ("LoseLife", self.max_build_time - 1), True)
+
+        total, lose_life = self.weighted_count(positive, negative)
+        if total == 0:
+            raise ValueError("The inputs contradict the theory")
+        return lose_life / total
+
+
+def input_props(num_balls):
+    # The propositions that Circuit.condition_inputs() conditions on, on the configured canvas
+    import run
+
+    inputs = [run.Horizontal(), run.Vertical()] + [run.CursorPosition(x, y) for x, y in run.canvas_cells()]
+    for b in range(num_balls):
+        inputs += [run.BallVelocityX(b, 0), run.BallVelocityY(b, 0)]
+        inputs += [run.BallPosition(b, x, y, 0) for x, y in run.canvas_cells()]
+    return inputs
+
+
+def compile_circuit(theory, inputs, canvas, num_balls, max_build_time, timeout=None):
+    '''
+    Streams theory() (from the configured run.py) out as DIMACS and compiles it into a
+    Circuit with DSHARP, deciding on the input propositions first
+    '''
+    import run
+    import dimacs
+    from simplify import simplify_writer
+
+    writer = dimacs.DimacsWriter()
+    run.DIMACS_WRITER = writer
+    try:
+        theory()
+    finally:
+        run.DIMACS_WRITER = None
+
+    # Whatever the inputs that are fixed force is propagated before DSHARP sees it, keeping
+    # the propositions that queries are conditioned on (see simplify.py)
+    simplified = simplify_writer(writer, input_props(num_balls) + [run.LoseLife(max_build_time - 1)])
+    writer.close()
+    if simplified.unsatisfiable():
+        raise ValueError("The inputs contradict the theory")
+    ids = simplified.ids(writer.ids)
+
+    # Deciding on the inputs first leaves everything else to unit propagation
+    priority = ",".join(str(ids[prop]) for prop in inputs if prop in ids)
+
+    # Auxiliary variables (for conjunctions inside disjunctions) don't have a proposition
+    variables = [None] * simplified.num_vars
+    for prop, i in ids.items():
+        variables[i - 1] = list(prop._key)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cnf_path = os.path.join(directory, "theory.cnf")
+        nnf_path = os.path.join(directory, "theory.nnf")
+        with open(cnf_path, "w") as cnf:
+            simplified.write(cnf)
+
+        args = [dsharp_binary(), "-q", "-Fnnf", nnf_path]
+        if priority:
+            args += ["-priority", priority]
+        if timeout is not None:
+            args += ["-t", str(timeout)]
+        subprocess.run(args + [cnf_path], stdout=subprocess.DEVNULL, check=True)
+        if not os.path.exists(nnf_path) or os.path.getsize(nnf_path) == 0:
+            raise RuntimeError("DSHARP didn't compile the theory (it may have run out of time)")
+
+        with open(nnf_path) as nnf:
+            return Circuit.parse(nnf, variables, canvas, num_balls, max_build_time)
+
+
+def compile_canvas(canvas, num_balls, max_build_time=None, timeout=None):
+    '''
+    Compiles the dynamics for a canvas and number of balls into a Circuit with DSHARP
+    (without a horizon, it's long enough for a line at any empty cell)
+    '''
+    import run
+
+    if max_build_time is None:
+        max_build_time = canvas_horizon(canvas)
+    run.configure("H", (0, 0), [(0, 0, 1, 1)] * num_balls, canvas, max_build_time)
+    return compile_circuit(run.canvas_theory, input_props(num_balls), canvas, num_balls, max_build_time, timeout)
+
+
+def compile_theory(cursor_orientation, cursor_position, balls, canvas, max_build_time=None, pruned=True, timeout=None):
+    '''
+    Compiles the theory for one set of inputs into a Circuit with DSHARP, where the
+    velocities that are None are left free
+    '''
+    import run
+
+    run.configure(cursor_orientation, cursor_position, balls, canvas, max_build_time)
+    inputs = [velocity(b, 0) for b in range(len(balls)) for velocity in (run.BallVelocityX, run.BallVelocityY)]
+    return compile_circuit(lambda: run.theory(pruned), inputs, canvas, len(balls), run.MAX_BUILD_TIME, timeout)
+
+
+def simulated_probability(cursor_orientation, cursor_position, balls, canvas, odds=None, max_build_time=None):
+    '''
+    The chance of losing a life when the velocities that are None are uncertain, by simulating
+    every way they could be (which takes 4 ** len(balls) simulations at most)
+    '''
+    from simulate import simulate
+
+    uncertain = [(b, i) for b, ball in enumerate(balls) for i in (2, 3) if ball[i] is None]
+    probability = 0.0
+    for signs in itertools.product((1, -1), repeat=len(uncertain)):
+        chance = 1.0
+        certain = [list(ball) for ball in balls]
+        for (b, i), sign in zip(uncertain, signs):
+            certain[b][i] = sign
+            p = odds[b][i - 2] if odds is not None else 0.5
+            chance *= p if sign > 0 else 1 - p
+        if simulate(cursor_orientation, cursor_position, certain, canvas, max_build_time).lose_life:
+            probability += chance
+    return probability
+
+
+if __name__ == "__main__":
+    from inputs import CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS
+
+    parser = argparse.ArgumentParser(description="Compile the canvas from inputs.py into a d-DNNF circuit once, and answer queries on it by conditioning")
+    parser.add_argument("circuit", help="the .npz file the compiled circuit is saved to (and loaded from)")
+    parser.add_argument("--compile", action="store_true",
+                        help="compile the circuit (for the canvas and number of balls from inputs.py) even if the file exists")
+    parser.add_argument("--timeout", type=int, help="give up compiling after this many seconds")
+    parser.add_argument("--queries", type=int,
+                        help="check the circuit against the simulation on random cursors and balls instead")
+    parser.add_argument("--width", type=int, help="compile an empty canvas of this width (and --height) instead")
+    parser.add_argument("--height", type=int)
+    parser.add_argument("--balls", type=int, default=len(BALLS), help="number of balls to compile an empty canvas for")
+    parser.add_argument("--theory", action="store_true",
+                        help="compile the theory for the inputs from inputs.py instead, with the velocities that are None left free")
+    parser.add_argument("--uncertain", action="store_true",
+                        help="with --queries, make some velocities uncertain and check the chance of losing a life instead")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.compile or not os.path.exists(args.circuit):
+        canvas, num_balls = CANVAS, len(BALLS)
+        if args.width is not None:
+            canvas, num_balls = [[0] * args.width for _ in range(args.height or args.width)], args.balls
+
+        start = time.perf_counter()
+        if args.theory:
+            circuit = compile_theory(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS, timeout=args.timeout)
+        else:
+            circuit = compile_canvas(canvas, num_balls, timeout=args.timeout)
+        circuit.save(args.circuit)
+        print(f"Compiled {circuit.size()[0]} nodes and {circuit.size()[1]} edges in {time.perf_counter() - start:.2f}s")
+    else:
+        circuit = Circuit.load(args.circuit)
+
+    if args.queries is None:
+        if circuit.canvas != CANVAS or circuit.num_balls != len(BALLS):
+            parser.error("the circuit wasn't compiled for the canvas and balls from inputs.py (check it with --queries)")
+        if any(x_vel is None or y_vel is None for _, _, x_vel, y_vel in BALLS):
+            probability = circuit.lose_life_probability(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS)
+            print(f"You will lose a life if you create the line with a chance of {probability:.1%}")
+        elif circuit.lose_life(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS):
+            print("You will lose a life if you create the line")
+        else:
+            print("You won't lose a life if you create the line")
+    else:
+        from simulate import simulate
+
+        rng = random.Random(args.seed)
+        empty = [(x, y) for y in range(len(circuit.canvas)) for x in range(len(circuit.canvas[0])) if circuit.canvas[y][x] == 0]
+        velocities = (-1, 1, None) if args.uncertain else (-1, 1)
+        queries = [(rng.choice(("H", "V")), rng.choice(empty),
+                    [(*rng.choice(empty), rng.choice(velocities), rng.choice(velocities)) for _ in range(circuit.num_balls)])
+                   for _ in range(args.queries)]
+
+        if args.uncertain:
+            odds = [[(rng.random(), rng.random()) for _ in range(circuit.num_balls)] for _ in queries]
+            start = time.perf_counter()
+            probabilities = [circuit.lose_life_probability(*query, query_odds) for query, query_odds in zip(queries, odds)]
+            elapsed = time.perf_counter() - start
+
+            error = max(abs(probability - simulated_probability(*query, circuit.canvas, query_odds, circuit.max_build_time))
+                        for query, query_odds, probability in zip(queries, odds, probabilities))
+            print(f"{args.queries} queries in {elapsed:.3f}s")
+            print(f"The chances are off from the simulation by at most {error:.2g}")
+            sys.exit()
+
+        start = time.perf_counter()
+        verdicts = circuit.lose_life_batch(queries)
+        elapsed = time.perf_counter() - start
+
+        disagreements = sum(verdict != simulate(*query, circuit.canvas).lose_life for query, verdict in zip(queries, verdicts))
+        print(f"{args.queries} queries in {elapsed:.3f}s")
+        print(f"{disagreements} of {args.queries} queries disagree with the simulation")
@@ -0,0 +1,107 @@
+'''
+Per-ball decomposition of the JezzBall encoding in run.py.
+
+Balls never interact with each other, only with the builders and the captured
+cells, and the builders don't depend on the balls at all. So creating a line
+loses a life if it loses a life with any one of the balls on its own: the
+theory splits into one sub-problem per ball (each with the same builders and
+captured cells), and those are solved concurrently in a process pool. As soon
+as one ball hits a building cell, the rest of the sub-problems are dropped.
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+from multiprocessing import Pool
+
+from inputs import CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS
+
+# Each worker process keeps the inputs that every ball shares between sub-problems
+_worker = {}
+
+
+def _start_worker(cursor_orientation, cursor_position, canvas, max_build_time, pruned, dimacs):
+    _worker.update(cursor_orientation=cursor_orientation, cursor_position=cursor_position, canvas=canvas,
+                   max_build_time=max_build_time, pruned=pruned, dimacs=dimacs)
+
+
+def _ball_loses_life(ball):
+    import run
+
+    run.configure(_worker["cursor_orientation"], _worker["cursor_position"], [ball], _worker["canvas"],
+                  _worker["max_build_time"])
+    verdict = run.LoseLife(run.MAX_BUILD_TIME - 1)
+
+    if not _worker["dimacs"]:
+        return run.theory(_worker["pruned"]).compile().solve()[verdict]
+
+    import dimacs
+    with tempfile.TemporaryDirectory() as directory:
+        cnf_path = os.path.join(directory, "ball.cnf")
+        with open(cnf_path, "w") as cnf, open(cnf_path + ".vars", "w") as variables:
+            dimacs.write_dimacs(cnf, variables, _worker["pruned"])
+        with open(cnf_path + ".vars") as variables:
+            return dimacs.solve(cnf_path, dimacs.read_variables(variables))[verdict]
+
+
+def lose_life(cursor_orientation=CURSOR_ORIENTATION, cursor_position=CURSOR_POSITION, balls=BALLS, canvas=CANVAS,
+              max_build_time=None, pruned=False, dimacs=False, processes=None):
+    '''
+    Whether creating a line loses a life, solving one sub-problem per ball (with
+    dimacs=True, each one is streamed to kissat instead of compiled by bauhaus)
+    '''
+    # Without any balls, nothing can hit the line (and there's nothing to start a pool for)
+    if not balls:
+        return False
+
+    initargs = (cursor_orientation, cursor_position, canvas, max_build_time, pruned, dimacs)
+
+    if processes == 1:
+        _start_worker(*initargs)
+        return any(_ball_loses_life(ball) for ball in balls)
+
+    processes = min(processes or os.cpu_count(), len(balls))
+    with Pool(processes, initializer=_start_worker, initargs=initargs) as pool:
+        # Leaving the with block terminates whatever sub-problems are still running
+        return any(pool.imap_unordered(_ball_loses_life, balls))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Figure out whether creating a line with the inputs from inputs.py loses a life, one ball at a time")
+    parser.add_argument("--processes", type=int,
+                        help="number of worker processes (defaults to the number of cores, 1 solves the balls one after another)")
+    parser.add_argument("--pruned", action="store_true",
+                        help="only encode the states that are reachable from the inputs")
+    parser.add_argument("--dimacs", action="store_true",
+                        help="stream each sub-problem out as DIMACS and solve it with kissat instead of compiling it")
+    parser.add_argument("--queries", type=int,
+                        help="check the decomposition against the simulation on random scenarios instead")
+    parser.add_argument("--width", type=int, default=6)
+    parser.add_argument("--height", type=int, default=6)
+    parser.add_argument("--balls", type=int, default=3)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    solve = lambda *scenario: lose_life(*scenario, pruned=args.pruned, dimacs=args.dimacs, processes=args.processes)
+
+    if args.queries is None:
+        start = time.perf_counter()
+        if solve(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS):
+            print("You will lose a life if you create the line")
+        else:
+            print("You won't lose a life if you create the line")
+        print(f"Solved {len(BALLS)} balls in {time.perf_counter() - start:.2f}s")
+    else:
+        from simulate import random_scenario, simulate
+
+        rng = random.Random(args.seed)
+        scenarios = [random_scenario(rng, args.width, args.height, args.balls) for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        verdicts = [solve(*scenario) for scenario in scenarios]
+        elapsed = time.perf_counter() - start
+
+        disagreements = sum(verdict != simulate(*scenario).lose_life for scenario, verdict in zip(scenarios, verdicts))
+        print(f"{args.queries} queries in {elapsed:.2f}s")
+        print(f"{disagreements} of {args.queries} queries disagree with the simulation")
@@ -0,0 +1,201 @@
+'''
+Streaming DIMACS CNF export of the JezzBall encoding in run.py.
+
+Instead of collecting every constraint in E and compiling the whole theory into
+an NNF, a DimacsWriter takes the constraints as implies() creates them, gives
+every proposition a dense integer id and writes the clauses straight out. The
+clauses are spooled to a temporary file (the DIMACS header needs the clause
+count up front), so memory only grows with the number of propositions.
+
+The variable map is written to a sidecar file (one JSON list per line: the id,
+then the proposition's class name and arguments), so that solutions from
+kissat, or anything else that reads DIMACS, can be decoded back into run.py's
+propositions.
+'''
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import run
+
+
+class DimacsWriter:
+    '''
+    Turns the constraints from implies() into clauses over integer ids. A conjunction
+    inside a disjunction gets an auxiliary variable that is defined to be equal to it,
+    so the clauses have exactly the same models as the theory.
+    '''
+    def __init__(self):
+        self.ids = {}
+        self.num_vars = 0
+        self.clauses = 0
+        self.spool = tempfile.TemporaryFile("w+")
+        self.conjunctions = {}
+
+    def id(self, prop):
+        if prop not in self.ids:
+            self.num_vars += 1
+            self.ids[prop] = self.num_vars
+        return self.ids[prop]
+
+    def literal(self, node):
+        # A proposition, or a (negated) bauhaus CustomNNF wrapping one
+        if not hasattr(node, "typ"):
+            return self.id(node)
+        if node.typ == "var":
+            var = node.args[0]
+            return self.id(var.name) if var.true else -self.id(var.name)
+        if node.typ == "not":
+            return -self.literal(node.args[0])
+        raise ValueError(f"Expected a literal, got a CustomNNF of type {node.typ}")
+
+    def conjuncts(self, node):
+        if getattr(node, "typ", None) == "and":
+            return [literal for arg in node.args for literal in self.conjuncts(arg)]
+        return [self.literal(node)]
+
+    def disjunct(self, node):
+        if getattr(node, "typ", None) != "and":
+            return self.literal(node)
+
+        literals = frozenset(self.conjuncts(node))
+        if literals not in self.conjunctions:
+            self.num_vars += 1
+            aux = self.conjunctions[literals] = self.num_vars
+            for literal in literals:
+                self.clause([-aux, literal])
+            self.clause([aux] + [-literal for literal in literals])
+        return self.conjunctions[literals]
+
+    def clause(self, literals):
+        self.spool.write(" ".join(map(str, literals)) + " 0\n")
+        self.clauses += 1
+
+    def add(self, condition, result):
+        '''
+        Writes out "condition implies result", where the condition is True or a conjunction
+        of literals, and the result is False, a conjunction of literals, or a disjunction
+        of literals and conjunctions of literals
+        '''
+        premise = [] if condition is True else [-literal for literal in self.conjuncts(condition)]
+
+        if result is False:
+            self.clause(premise)
+        elif getattr(result, "typ", None) == "and":
+            for literal in self.conjuncts(result):
+                self.clause(premise + [literal])
+        elif getattr(result, "typ", None) == "or":
+            self.clause(premise + [self.disjunct(arg) for arg in result.args])
+        else:
+            self.clause(premise + [self.literal(result)])
+
+    def write(self, out):
+        out.write(f"p cnf {self.num_vars} {self.clauses}\n")
+        self.spool.seek(0)
+        shutil.copyfileobj(self.spool, out)
+        out.flush()
+
+    def write_variables(self, out):
+        for prop, i in self.ids.items():
+            out.write(json.dumps([i, *prop._key]) + "\n")
+
+    def close(self):
+        self.spool.close()
+
+
+def write_dimacs(cnf, variables, pruned=False, parametric=False):
+    '''
+    Streams theory(pruned) (or parametric_theory()) for the inputs run.py is configured
+    with out to the cnf file object, and its variable map to the variables file object
+    '''
+    writer = DimacsWriter()
+    run.DIMACS_WRITER = writer
+    try:
+        if parametric:
+            run.parametric_theory()
+        else:
+            run.theory(pruned)
+    finally:
+        run.DIMACS_WRITER = None
+
+    writer.write(cnf)
+    writer.write_variables(variables)
+    writer.close()
+    return writer
+
+
+def read_variables(variables):
+    '''
+    Reads a variable map back in as {id: proposition}
+    '''
+    props = {}
+    for line in variables:
+        i, name, *args = json.loads(line)
+        props[i] = getattr(run, name)(*[tuple(arg) if isinstance(arg, list) else arg for arg in args])
+    return props
+
+
+def kissat_binary():
+    if shutil.which("kissat") is not None:
+        return "kissat"
+    import nnf
+    return os.path.join(os.path.dirname(os.path.abspath(nnf.__file__)), "bin", "kissat")
+
+
+def solve(cnf_path, props):
+    '''
+    Runs kissat on a DIMACS file, returning {proposition: value} (or None if it's unsatisfiable)
+    '''
+    proc = subprocess.run([kissat_binary(), "-q", cnf_path], stdout=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode == 20:
+        return None
+    if proc.returncode != 10:
+        raise RuntimeError(f"kissat failed with exit code {proc.returncode}")
+
+    solution = {}
+    for line in proc.stdout.splitlines():
+        if line.startswith("v "):
+            for literal in map(int, line[2:].split()):
+                if abs(literal) in props:
+                    solution[props[abs(literal)]] = literal > 0
+    return solution
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the encoding with the inputs from inputs.py out as DIMACS CNF")
+    parser.add_argument("output", help="the DIMACS file to write (or - for stdout)")
+    parser.add_argument("--variables", metavar="FILE",
+                        help="where to write the variable map (defaults to OUTPUT.vars)")
+    parser.add_argument("--pruned", action="store_true",
+                        help="only encode the states that are reachable from the inputs")
+    parser.add_argument("--parametric", action="store_true",
+                        help="write the dynamics without the inputs (see run.parametric_theory())")
+    parser.add_argument("--solve", action="store_true",
+                        help="solve the written file with kissat and print whether a life is lost")
+    args = parser.parse_args()
+
+    if args.output == "-" and (args.variables is None or args.solve):
+        parser.error("writing to stdout needs --variables, and can't be used with --solve")
+    variables_path = args.variables or args.output + ".vars"
+
+    with open(variables_path, "w") as variables:
+        if args.output == "-":
+            writer = write_dimacs(sys.stdout, variables, args.pruned, args.parametric)
+        else:
+            with open(args.output, "w") as cnf:
+                writer = write_dimacs(cnf, variables, args.pruned, args.parametric)
+    print(f"{writer.num_vars} variables, {writer.clauses} clauses", file=sys.stderr)
+
+    if args.solve:
+        with open(variables_path) as variables:
+            solution = solve(args.output, read_variables(variables))
+        if solution is None:
+            print("The inputs contradict the theory")
+        elif solution[run.LoseLife(run.MAX_BUILD_TIME - 1)]:
+            print("You will lose a life if you create the line")
+        else:
+            print("You won't lose a life if you create the line")
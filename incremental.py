@@ -0,0 +1,157 @@
+'''
+Incremental SAT solving of the JezzBall model in run.py.
+
+theory() bakes the inputs into the encoding as unit constraints, so every new
+game state means building and solving the whole theory again. A Session builds
+the dynamics once for a canvas size, number of balls and horizon (see
+run.parametric_theory()) and loads them into one incremental SAT solver. Each
+query only passes its inputs in as assumptions, so the solver keeps its clause
+database (and everything it learned) from one query to the next.
+'''
+import argparse
+import random
+import time
+
+from nnf import tseitin
+from pysat.solvers import Solver
+
+import run
+from simulate import longest_horizon
+from timeline import TimelineIndex
+
+
+class Session:
+    '''
+    An incremental SAT solver loaded with the dynamics for one canvas size, number
+    of balls and horizon, that answers whether creating a line loses a life
+    '''
+    def __init__(self, width, height, num_balls, max_build_time=None, solver="glucose4"):
+        # parametric_theory() only looks at the canvas size, the number of balls and
+        # the horizon, so any inputs of the right size will do here
+        # (without a horizon, it has to be long enough for a line anywhere on the canvas)
+        blank = [[0] * width for _ in range(height)]
+        if max_build_time is None:
+            max_build_time = longest_horizon(width, height)
+        run.configure("H", (0, 0), [(0, 0, 1, 1)] * num_balls, blank, max_build_time)
+        cnf = tseitin.to_CNF(run.parametric_theory().compile())
+
+        self.width = width
+        self.height = height
+        self.num_balls = num_balls
+        self.max_build_time = run.MAX_BUILD_TIME
+
+        self.ids = {var: i for i, var in enumerate(cnf.vars(), start=1)}
+        clauses = [[self.id(lit.name) if lit.true else -self.id(lit.name) for lit in clause] for clause in cnf]
+        self.solver = Solver(name=solver, bootstrap_with=clauses)
+
+        # The variables that the inputs are passed in through
+        self.horizontal = self.id(run.Horizontal())
+        self.vertical = self.id(run.Vertical())
+        self.cursor = [[self.id(run.CursorPosition(x, y)) for x in range(width)] for y in range(height)]
+        self.captured = [[self.id(run.CapturedCell(x, y, 0)) for x in range(width)] for y in range(height)]
+        self.ball_positions = [[[self.id(run.BallPosition(b, x, y, 0)) for x in range(width)] for y in range(height)]
+                               for b in range(num_balls)]
+        self.velocities = [(self.id(run.BallVelocityX(b, 0)), self.id(run.BallVelocityY(b, 0)))
+                           for b in range(num_balls)]
+        # Whether a life is lost by each time step, so that queries can look less far ahead
+        # than the session does
+        self.verdicts = [self.id(run.LoseLife(t)) for t in range(self.max_build_time)]
+
+        # Where each variable goes in a decoded timeline (see timeline.py)
+        self.timeline_index = TimelineIndex()
+        self.timeline_variables = self.timeline_index.variables(self.ids)
+
+    def id(self, var):
+        # Variables that the CNF conversion simplified away are unconstrained, so they just get a new id
+        if var not in self.ids:
+            self.ids[var] = len(self.ids) + 1
+        return self.ids[var]
+
+    def assumptions(self, cursor_orientation, cursor_position, balls, canvas):
+        '''
+        The inputs as assumption literals (the same state as run.initial_state())
+        '''
+        if len(canvas) != self.height or len(canvas[0]) != self.width or len(balls) != self.num_balls:
+            raise ValueError(f"This session is for a {self.width}x{self.height} canvas with {self.num_balls} balls")
+
+        horizontal = cursor_orientation == "H"
+        literals = [self.horizontal if horizontal else -self.horizontal,
+                    -self.vertical if horizontal else self.vertical]
+
+        cursor_x, cursor_y = cursor_position
+        for y in range(self.height):
+            for x in range(self.width):
+                literals.append(self.cursor[y][x] if (x, y) == (cursor_x, cursor_y) else -self.cursor[y][x])
+                literals.append(self.captured[y][x] if canvas[y][x] == 1 else -self.captured[y][x])
+
+        for b, (ball_x, ball_y, x_vel, y_vel) in enumerate(balls):
+            positions = self.ball_positions[b]
+            for y in range(self.height):
+                for x in range(self.width):
+                    literals.append(positions[y][x] if (x, y) == (ball_x, ball_y) else -positions[y][x])
+            x_id, y_id = self.velocities[b]
+            literals.append(x_id if x_vel > 0 else -x_id)
+            literals.append(y_id if y_vel > 0 else -y_id)
+
+        return literals
+
+    def lose_life(self, cursor_orientation, cursor_position, balls, canvas, max_build_time=None):
+        '''
+        Whether creating a line with these inputs loses a life within max_build_time steps
+        (by default, the session's horizon)
+        '''
+        if max_build_time is None:
+            max_build_time = self.max_build_time
+        if not 0 < max_build_time <= self.max_build_time:
+            raise ValueError(f"This session only looks {self.max_build_time} steps ahead")
+        if not self.solver.solve(assumptions=self.assumptions(cursor_orientation, cursor_position, balls, canvas)):
+            raise ValueError("The inputs contradict the theory")
+        return self.solver.get_model()[self.verdicts[max_build_time - 1] - 1] > 0
+
+    def timeline(self, cursor_orientation, cursor_position, balls, canvas):
+        '''
+        The whole timeline of creating a line with these inputs, as NumPy arrays (see timeline.py)
+        '''
+        if not self.solver.solve(assumptions=self.assumptions(cursor_orientation, cursor_position, balls, canvas)):
+            raise ValueError("The inputs contradict the theory")
+        return self.timeline_index.decode_model(self.solver.get_model(), self.timeline_variables)
+
+    def close(self):
+        self.solver.delete()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    from simulate import random_scenario, simulate
+
+    parser = argparse.ArgumentParser(description="Answer random queries with an incremental session and check them against the simulation")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--width", type=int, default=6)
+    parser.add_argument("--height", type=int, default=6)
+    parser.add_argument("--balls", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--random-horizons", action="store_true",
+                        help="give each query an explicit horizon, shorter than the session's")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with Session(args.width, args.height, args.balls) as session:
+        print(f"Built the session in {time.perf_counter() - start:.2f}s")
+
+        rng = random.Random(args.seed)
+        scenarios = [random_scenario(rng, args.width, args.height, args.balls) for _ in range(args.queries)]
+        if args.random_horizons:
+            scenarios = [(*scenario, rng.randint(1, session.max_build_time)) for scenario in scenarios]
+
+        start = time.perf_counter()
+        verdicts = [session.lose_life(*scenario) for scenario in scenarios]
+        elapsed = time.perf_counter() - start
+
+    disagreements = sum(verdict != simulate(*scenario).lose_life for scenario, verdict in zip(scenarios, verdicts))
+    print(f"{args.queries} queries in {elapsed:.2f}s ({args.queries / elapsed:.0f} queries/s)")
+    print(f"{disagreements} of {args.queries} queries disagree with the simulation")
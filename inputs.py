@@ -5,7 +5,7 @@ CURSOR_POSITION = (3, 2) # (x, y)
 BALLS = [(1, 1, 1, 1), 
          (5, 5, -1, 1), 
          (10, 10, -1, -1),
-         (15, 15, 1, -1)]  # (x, y, x_vel, y_vel)
+         (15, 15, 1, -1)]  # (x, y, x_vel, y_vel), where a velocity is None if it's uncertain (see run.py --likelihood)
 
 # 27 x 19 canvas, like the actual game
 CANVAS = [
@@ -0,0 +1,255 @@
+'''
+A planner for the best move: of every line the cursor could create (at every
+empty cell, in both orientations), the one that captures the most area without
+losing a life.
+
+Once a line is done, its cells are captured, and so is every pocket of empty
+cells that it seals off from all of the balls (the region fill JezzBall does).
+The area of a move is the number of cells it captures in all. Balls move
+diagonally, and slip between two captured cells that only touch at a corner,
+so regions and pockets are made of cells that touch at a side or a corner.
+
+Rather than simulating every move, the moves are tried in order of an upper
+bound on their area, which only needs the line's cells: the line captures its
+own cells, and at most all of the pockets it cuts its region of the canvas into,
+except for the smallest one if a ball is in that region (a ball stays on its
+side of a safe line). Once the best safe move found captures at least as much as
+the next bound, none of the moves left can beat it. The moves are simulated in
+batches across a process pool, with the balls' trajectory (which the line
+doesn't change until part of it is captured) worked out once and shared.
+'''
+import argparse
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+from inputs import BALLS, CANVAS
+from simulate import BUILDER_STEPS, ORIENTATION_BUILDERS, ball_trajectory, random_scenario, simulate
+
+ORIENTATIONS = ("H", "V")
+
+# The cells a ball can get to (or that a pocket spreads to) from a cell
+NEIGHBOURS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+
+# Each worker process keeps the inputs between moves
+_worker = {}
+
+
+class Move:
+    '''
+    Creating a line at position in orientation, which loses a life or captures area cells
+    (where captured is the canvas once the line and the pockets it seals off are captured)
+    '''
+    def __init__(self, cursor_orientation, cursor_position, lose_life, area=0, captured=None):
+        self.cursor_orientation = cursor_orientation
+        self.cursor_position = cursor_position
+        self.lose_life = lose_life
+        self.area = area
+        self.captured = captured
+
+
+def regions(cells):
+    '''
+    Splits a set of cells into its (8-connected) regions
+    '''
+    left = set(cells)
+    found = []
+    while left:
+        stack = [left.pop()]
+        region = set(stack)
+        while stack:
+            x, y = stack.pop()
+            for dx, dy in NEIGHBOURS:
+                if (x + dx, y + dy) in left:
+                    left.remove((x + dx, y + dy))
+                    region.add((x + dx, y + dy))
+                    stack.append((x + dx, y + dy))
+        found.append(region)
+    return found
+
+
+def line_cells(cursor_orientation, cursor_position, canvas):
+    # The cells a line covers once it's done: from the cursor to a captured cell or the border each way
+    width = len(canvas[0])
+    height = len(canvas)
+    cells = {tuple(cursor_position)}
+    for d in ORIENTATION_BUILDERS[cursor_orientation]:
+        dx, dy = BUILDER_STEPS[d]
+        x, y = cursor_position
+        while 0 <= x + dx < width and 0 <= y + dy < height and canvas[y + dy][x + dx] == 0:
+            x, y = x + dx, y + dy
+            cells.add((x, y))
+    return cells
+
+
+def area_bound(cursor_orientation, cursor_position, balls, canvas, canvas_regions):
+    '''
+    An upper bound on the area a move can capture, see the module docstring
+    '''
+    line = line_cells(cursor_orientation, cursor_position, canvas)
+    region = next(region for region in canvas_regions if tuple(cursor_position) in region)
+    pockets = [len(pocket) for pocket in regions(region - line)]
+    if pockets and any((x, y) in region for x, y, _, _ in balls):
+        return len(line) + sum(pockets) - min(pockets)
+    return len(line) + sum(pockets)
+
+
+def fill(captured, balls, region):
+    '''
+    The captured cells once every pocket of empty cells in region (the region of the canvas
+    the line was created in) without a ball in it is captured too
+    '''
+    empty = region - captured
+    ball_cells = {(x, y) for x, y, _, _ in balls}
+    pockets = [pocket for pocket in regions(empty) if not pocket & ball_cells]
+    return captured.union(*pockets)
+
+
+def empty_regions(canvas):
+    return regions({(x, y) for y in range(len(canvas)) for x in range(len(canvas[0])) if canvas[y][x] == 0})
+
+
+def _start_worker(balls, canvas, ball_frames):
+    _worker.update(balls=balls, canvas=canvas, ball_frames=ball_frames, regions=empty_regions(canvas))
+
+
+def _evaluate(query):
+    cursor_orientation, cursor_position = query
+    canvas = _worker["canvas"]
+    simulation = simulate(cursor_orientation, cursor_position, _worker["balls"], canvas, None, _worker["ball_frames"])
+    if simulation.lose_life:
+        return Move(cursor_orientation, cursor_position, True)
+
+    last = simulation.frames[-1]
+    region = next(region for region in _worker["regions"] if cursor_position in region)
+    captured = fill(last.captured, last.balls, region)
+    area = len(captured) - sum(map(sum, canvas))
+    grid = [[int((x, y) in captured) for x in range(simulation.width)] for y in range(simulation.height)]
+    return Move(cursor_orientation, cursor_position, False, area, grid)
+
+
+def best_move(balls=BALLS, canvas=CANVAS, processes=None, batch=None, budget=None):
+    '''
+    The safe move that captures the most area (or None if every move loses a life), along
+    with the number of moves that were simulated. With a budget (in seconds), the best move
+    found so far is returned once it runs out, even if a better one could be left.
+    '''
+    start = time.perf_counter()
+    width = len(canvas[0])
+    height = len(canvas)
+    canvas_regions = empty_regions(canvas)
+
+    moves = [(orientation, (x, y))
+             for orientation in ORIENTATIONS
+             for y in range(height)
+             for x in range(width)
+             if canvas[y][x] == 0]
+    # Moves along the same run of empty cells create the same line, and share a bound
+    line_bounds = {}
+    bounds = {}
+    for move in moves:
+        line = frozenset(line_cells(*move, canvas))
+        if line not in line_bounds:
+            line_bounds[line] = area_bound(*move, balls, canvas, canvas_regions)
+        bounds[move] = line_bounds[line]
+    moves.sort(key=bounds.get, reverse=True)
+
+    processes = processes or os.cpu_count()
+    batch = batch or 4 * processes
+    ball_frames = ball_trajectory(balls, canvas)
+
+    best = None
+    simulated = 0
+    if processes == 1:
+        _start_worker(balls, canvas, ball_frames)
+        pool = None
+        evaluate = lambda queries: map(_evaluate, queries)
+    else:
+        pool = Pool(processes, initializer=_start_worker, initargs=(balls, canvas, ball_frames))
+        evaluate = lambda queries: pool.imap(_evaluate, queries)
+
+    try:
+        for i in range(0, len(moves), batch):
+            # Nothing left can capture more than the best safe move so far
+            if best is not None and bounds[moves[i]] <= best.area:
+                break
+            if budget is not None and best is not None and time.perf_counter() - start > budget:
+                break
+
+            for move in evaluate(moves[i:i + batch]):
+                simulated += 1
+                if not move.lose_life and (best is None or move.area > best.area):
+                    best = move
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    return best, simulated
+
+
+def check(rng, width, height, num_balls, captured_density):
+    '''
+    Simulates every move on a random canvas, returning whether best_move() found a move with
+    the most area there is, and the number of moves that captured more than their bound
+    '''
+    _, _, balls, canvas = random_scenario(rng, width, height, num_balls, captured_density)
+    canvas_regions = empty_regions(canvas)
+    _start_worker(balls, canvas, ball_trajectory(balls, canvas))
+
+    best_area = None
+    over_bound = 0
+    for orientation in ORIENTATIONS:
+        for y in range(height):
+            for x in range(width):
+                if canvas[y][x] == 1:
+                    continue
+                move = _evaluate((orientation, (x, y)))
+                if move.lose_life:
+                    continue
+                best_area = max(best_area or 0, move.area)
+                over_bound += move.area > area_bound(orientation, (x, y), balls, canvas, canvas_regions)
+
+    best, _ = best_move(balls, canvas, processes=1, batch=1)
+    return (best.area if best is not None else None) == best_area, over_bound
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the safe line that captures the most area with the balls and canvas from inputs.py")
+    parser.add_argument("--processes", type=int,
+                        help="number of worker processes (defaults to the number of cores, 1 simulates the moves one after another)")
+    parser.add_argument("--batch", type=int, help="number of moves simulated between checks of the bound (defaults to 4 per process)")
+    parser.add_argument("--budget", type=float, help="return the best move found after this many ms")
+    parser.add_argument("--check", type=int, metavar="N",
+                        help="instead, check the search against simulating every move on N random canvases")
+    parser.add_argument("--width", type=int, default=7)
+    parser.add_argument("--height", type=int, default=6)
+    parser.add_argument("--balls", type=int, default=2)
+    parser.add_argument("--density", type=float, default=0.35, help="chance of each cell being captured")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.check is not None:
+        rng = random.Random(args.seed)
+        mismatches = over_bound = 0
+        for _ in range(args.check):
+            found, over = check(rng, args.width, args.height, rng.randint(1, args.balls), args.density)
+            mismatches += not found
+            over_bound += over
+        print(f"{mismatches} of {args.check} canvases where the search missed the move with the most area")
+        print(f"{over_bound} moves that captured more than their bound")
+        sys.exit()
+
+    start = time.perf_counter()
+    move, simulated = best_move(processes=args.processes, batch=args.batch,
+                                budget=args.budget / 1000 if args.budget is not None else None)
+    elapsed = time.perf_counter() - start
+
+    if move is None:
+        print("Every line loses a life")
+    else:
+        print(f"Create a line at {move.cursor_position} in orientation {move.cursor_orientation} to capture {move.area} cells")
+        for row in move.captured:
+            print(row)
+    print(f"Simulated {simulated} of {2 * sum(row.count(0) for row in CANVAS)} moves in {elapsed * 1000:.1f}ms")
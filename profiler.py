@@ -0,0 +1,107 @@
+'''
+Instrumentation for finding out which parts of the encoding in run.py are expensive.
+
+theory() and dynamics() add their constraints in families (the initial state,
+the cardinality constraints, the lose life rules, ball_movement(), ...), and
+while run.PROFILE is set to a Profiler, each family records:
+
+  constraints  - how many constraints (or DIMACS clauses) it added
+  propositions - how many propositions its constraints brought into the encoding
+                 (ones that an earlier family already used aren't counted again)
+  seconds      - how long it took to add them
+  peak_mib     - the most memory it had allocated at once (only with memory=True,
+                 which uses tracemalloc, so the times include its overhead)
+
+The phases after encoding (compiling and solving) are timed too, and the whole
+profile is written out as JSON (run.py --sat --profile FILE, and add
+--profile-memory for the peak memory).
+'''
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Profiler:
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.families = {}
+        self.phases = {}
+        # The (condition, result) of every constraint added by the current family
+        self.pending = []
+        self.seen = set()
+
+    def propositions(self, node):
+        # Counts the propositions in a constraint that no family has used before
+        stack = [node]
+        added = 0
+        while stack:
+            node = stack.pop()
+            if hasattr(node, "_key"):
+                if node not in self.seen:
+                    self.seen.add(node)
+                    added += 1
+            elif hasattr(node, "args"):
+                stack.extend(node.args)
+        return added
+
+    @contextmanager
+    def family(self, name, constraint_count):
+        '''
+        Records the constraints that are added inside the with block under name, where
+        constraint_count() is how many constraints have been added so far
+        '''
+        self.pending = []
+        before = constraint_count()
+        if self.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+
+        yield
+
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if self.memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        # Counted once the family is done, so that it doesn't add to its time
+        propositions = sum(self.propositions(condition) + self.propositions(result)
+                           for condition, result in self.pending)
+        self.pending = []
+
+        stats = self.families.setdefault(name, {"constraints": 0, "propositions": 0, "seconds": 0.0, "peak_mib": None})
+        stats["constraints"] += constraint_count() - before
+        stats["propositions"] += propositions
+        stats["seconds"] += elapsed
+        if self.memory:
+            stats["peak_mib"] = max(stats["peak_mib"] or 0.0, peak / 2**20)
+
+    def phase(self, name, function):
+        '''
+        Calls function(), timing it as a phase (like compiling or solving)
+        '''
+        start = time.perf_counter()
+        result = function()
+        self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+        return result
+
+    def report(self):
+        '''
+        The profile, with the families ordered from the slowest to the fastest
+        '''
+        families = dict(sorted(self.families.items(), key=lambda item: item[1]["seconds"], reverse=True))
+        totals = {key: sum(stats[key] for stats in families.values()) for key in ("constraints", "propositions", "seconds")}
+        return {"families": families, "encoding": totals, "phases": self.phases, "memory_traced": self.memory}
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def print(self):
+        print(f"{'family':<24} {'constraints':>12} {'propositions':>13} {'seconds':>9} {'peak MiB':>9}")
+        for name, stats in self.report()["families"].items():
+            peak = "-" if stats["peak_mib"] is None else f"{stats['peak_mib']:.1f}"
+            print(f"{name:<24} {stats['constraints']:>12,} {stats['propositions']:>13,} {stats['seconds']:>9.3f} {peak:>9}")
+        for name, seconds in self.phases.items():
+            print(f"{name:<24} {'':>12} {'':>13} {seconds:>9.3f}")
@@ -1,441 +1,1006 @@
-from inputs import CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS
-
-CANV_CELLS_WIDTH = len(CANVAS[0])
-CANV_CELLS_HEIGHT = len(CANVAS)
-
-MAX_BUILD_TIME = CANV_CELLS_WIDTH
-
-DIRECTIONS = ("N", "E", "S", "W")
-
-from bauhaus import Encoding, proposition, constraint
-from bauhaus.utils import count_solutions, likelihood
-
-# These two lines make sure a faster SAT solver is used.
-from nnf import config
-
-config.sat_backend = "kissat"
-
-# Encoding that will store all of your constraints
-E = Encoding()
-
-
-class Hashable:
-    def __hash__(self):
-        return hash(str(self))
-
-    def __eq__(self, __value: object) -> bool:
-        return hash(self) == hash(__value)
-
-    def __repr__(self):
-        return str(self)
-
-
-########## PROPOSITION CLASSES ##########
-
-@proposition(E)
-class Horizontal(Hashable):
-    '''
-    H - This is true if the horizontal orientation is selected
-    '''
-    def __init__(self):
-        pass
-
-    def __str__(self) -> str:
-        return "The mouse has a horizontal orientation"
-
-
-@proposition(E)
-class Vertical(Hashable):
-    '''
-    V - This is true if the vertical orientation is selected
-    '''
-    def __init__(self):
-        pass
-
-    def __str__(self) -> str:
-        return "The mouse has a vertical orientation"
-
-
-@proposition(E)
-class CursorPosition(Hashable):
-    '''
-    M(x, y) - This is true if cell (x, y) is where the cursor/mouse is
-    (i.e. the starting position of where the line is created)
-    '''
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-    def __str__(self) -> str:
-        return f"The cursor is at ({self.x}, {self.y})"
-
-
-@proposition(E)
-class BuildingCell(Hashable):
-    '''
-    BC(D, x, y, t) - This is true if cell (x, y) is currently being built by the 
-    builder of direction D at time t (and you'll lose a life if a ball collides with it)
-    '''
-    def __init__(self, direction, x, y, time):
-        self.direction = direction
-        self.x = x
-        self.y = y
-        self.time = time
-
-    def __str__(self) -> str:
-        return f"The cell at ({self.x}, {self.y}) is currently being built at time {self.time}"
-
-
-@proposition(E)
-class CapturedCell(Hashable):
-    '''
-    C(x, y, t) - This is true if cell (x, y) is captured (i.e. the black cells) at time t
-    '''
-    def __init__(self, x, y, time):
-        self.x = x
-        self.y = y
-        self.time = time
-
-    def __str__(self) -> str:
-        return f"The cell ({self.x}, {self.y}) is captured at time {self.time}"
-
-
-@proposition(E)
-class BallPosition(Hashable):
-    '''
-    P(i, x, y, t) - This is true if ball i's position is at cell (x, y) at time t
-    '''
-    def __init__(self, ball_id, x, y, time):
-        self.ball_id = ball_id
-        self.x = x
-        self.y = y
-        self.time = time
-
-    def __str__(self) -> str:
-        return f"Ball {self.ball_id} is at ({self.x}, {self.y}) at time {self.time}"
-
-
-@proposition(E)
-class BallVelocityX(Hashable):
-    '''
-    Vx(i, t) - This is true if ball i is currently moving in the positive X direction at time t
-    '''
-    def __init__(self, ball_id, time):
-        self.ball_id = ball_id
-        self.time = time
-
-    def __str__(self) -> str:
-        return f"Ball {self.ball_id} is moving in the positive X direction at time {self.time}"
-
-
-@proposition(E)
-class BallVelocityY(Hashable):
-    '''
-    Vy(i, t) - This is true if ball i is currently moving in the positive Y direction at time t
-    '''
-    def __init__(self, ball_id, time):
-        self.ball_id = ball_id
-        self.time = time
-
-    def __str__(self) -> str:
-        return f"Ball {self.ball_id} is moving in the positive Y direction at time {self.time}"
-
-
-@proposition(E)
-class Builder(Hashable):
-    '''
-    B(D, x, y, t) - This is true if the builder of direction D (can be N, E, S, W) is at cell (x, y) at time t
-    '''
-    def __init__(self, direction, x, y, time):
-        self.direction = direction
-        self.x = x
-        self.y = y
-        self.time = time
-
-    def __str__(self) -> str:
-        return f"The {self.direction} builder is at cell ({self.x}, {self.y}) at time {self.time}"
-
-
-@proposition(E)
-class BuilderFinished(Hashable):
-    '''
-    BF(D, t) - This is true if the builder of direction D is finished building at time t 
-    '''
-    def __init__(self, direction, time):
-        self.direction = direction
-        self.time = time
-
-    def __str__(self) -> str:
-        return f"The {self.direction} builder is finished building at time {self.time}"
-
-
-@proposition(E)
-class LoseLife(Hashable):
-    '''
-    L - This is true if the player has lost a life from creating a line at time t or before
-    '''
-    def __init__(self, time):
-        self.time = time
-
-    def __str__(self) -> str:
-        return f"The player will have lost a life from creating a line by time {self.time}"
-
-
-########## PROPOSITION INSTANCES ##########
-horizontal_prop = Horizontal()
-vertical_prop = Vertical()
-
-cursor_pos_props = []
-for y in range(CANV_CELLS_HEIGHT):
-    for x in range(CANV_CELLS_WIDTH):
-        cursor_pos_props.append(CursorPosition(x, y))
-
-captured_cell_props = []
-building_cell_props = []
-for t in range(MAX_BUILD_TIME):
-    for y in range(CANV_CELLS_HEIGHT):
-        for x in range(CANV_CELLS_WIDTH):
-            captured_cell_props.append(CapturedCell(x, y, t))
-            for d in DIRECTIONS:
-                building_cell_props.append(BuildingCell(d, x, y, t))
-
-ball_pos_props = []
-ball_vel_x_props = []
-ball_vel_y_props = []
-for b in range(len(BALLS)):
-    for t in range(MAX_BUILD_TIME):
-        ball_vel_x_props.append(BallVelocityX(b, t))
-        ball_vel_y_props.append(BallVelocityY(b, t))
-
-        for y in range(CANV_CELLS_HEIGHT):
-            for x in range(CANV_CELLS_WIDTH):
-                ball_pos_props.append(BallPosition(b, x, y, t))
-
-builder_props = []
-for d in DIRECTIONS:
-    for t in range(MAX_BUILD_TIME):
-        for y in range(CANV_CELLS_HEIGHT):
-            for x in range(CANV_CELLS_WIDTH):
-                builder_props.append(Builder(d, x, y, t))
-
-lose_props = []
-for t in range(MAX_BUILD_TIME):
-    lose_props.append(LoseLife(t))
-
-
-########## EXPLORING THE MODEL ##########
-
-# The position of a ball cannot coincide with the position of a captured cell
-def ensure_no_overlap():
-        for i in range(len(BALLS)):
-            for t in range(MAX_BUILD_TIME):
-                for y in range(CANV_CELLS_HEIGHT):
-                    for x in range(CANV_CELLS_WIDTH):
-                        E.add_constraint(BallPosition(i, x, y, t) >> ~CapturedCell(x, y, t))
-
-# Balls move based on their velocities after a step in time to next cell if that cell isn't captured
-def ball_movement():
-    for b in range(len(BALLS)):
-        for y in range(CANV_CELLS_HEIGHT):
-            for x in range(CANV_CELLS_WIDTH):
-                for t in range(MAX_BUILD_TIME):
-                    E.add_constraint(BallPosition(b, x, y, t) & BallVelocityX(b, t) & BallVelocityY(b, t) & ~CapturedCell(x+1, y+1, t) >> BallPosition(b, x+1, y+1, t+1))
-                    E.add_constraint(BallPosition(b, x, y, t) & ~BallVelocityX(b, t) & BallVelocityY(b, t) & ~CapturedCell(x-1, y+1, t) >> BallPosition(b, x-1, y+1, t+1))
-                    E.add_constraint(BallPosition(b, x, y, t) & BallVelocityX(b, t) & ~BallVelocityY(b, t) & ~CapturedCell(x+1, y-1, t) >> BallPosition(b, x+1, y-1, t+1))
-                    E.add_constraint(BallPosition(b, x, y, t) & ~BallVelocityX(b, t) & ~BallVelocityY(b, t) & ~CapturedCell(x-1, y-1, t) >> BallPosition(b, x-1, y-1, t+1))
-
-# The full exploration of how builders could move and create building cells 
-def explore_builders():
-    # A builder creates a building cell and moves to the next cell after a step in time
-    for t in range(MAX_BUILD_TIME-1):
-        for y in range(CANV_CELLS_HEIGHT):
-            for x in range(CANV_CELLS_WIDTH):
-                if y > 0:
-                    # The builder will move on to the next cell if it is empty
-                    E.add_constraint(Builder("N", x, y, t) & ~CapturedCell(x, y-1, t) >> Builder("N", x, y-1, t+1))
-
-                    # The builder will finish building if it runs into a captured cell
-                    E.add_constraint(Builder("N", x, y, t) & CapturedCell(x, y-1, t) >> BuilderFinished("N", t+1))
-                else:
-
-                    # The builder finishes building if it runs into the canvas border
-                    E.add_constraint(Builder("N", x, y, t) >> BuilderFinished("N", t+1))
-
-                if y < CANV_CELLS_HEIGHT - 1:
-                    E.add_constraint(Builder("S", x, y, t) & ~CapturedCell(x, y+1, t) >> Builder("S", x, y+1, t+1))
-                    E.add_constraint(Builder("S", x, y, t) & CapturedCell(x, y+1, t) >> BuilderFinished("S", t+1))
-                else:
-                    E.add_constraint(Builder("S", x, y, t) >> BuilderFinished("S", t+1))
-
-                if x > 0:
-                    E.add_constraint(Builder("W", x, y, t) & ~CapturedCell(x-1, y, t) >> Builder("W", x-1, y, t+1))
-                    E.add_constraint(Builder("W", x, y, t) & CapturedCell(x-1, y, t) >> BuilderFinished("W", t+1))
-                else:
-                    E.add_constraint(Builder("W", x, y, t) >> BuilderFinished("W", t+1))
-
-                if x < CANV_CELLS_WIDTH - 1:
-                    E.add_constraint(Builder("E", x, y, t) & ~CapturedCell(x+1, y, t) >> Builder("E", x+1, y, t+1))
-                    E.add_constraint(Builder("E", x, y, t) & CapturedCell(x+1, y, t) >> BuilderFinished("E", t+1))
-                else:
-                    E.add_constraint(Builder("E", x, y, t) >> BuilderFinished("E", t+1))
-
-                for d in DIRECTIONS:
-                    # Each builder creates a building cell at its location
-                    E.add_constraint(Builder(d, x, y, t) >> BuildingCell(d, x, y, t))
-
-########## CONSTRAINTS ##########
-def theory():
-    # Intitialize the lose life proposition to be false at time 0:
-    E.add_constraint(~LoseLife(0))
-
-    # Initialize the cursor's orientation based of off the input
-    if CURSOR_ORIENTATION == "H":
-        E.add_constraint(Horizontal())
-    else:
-        E.add_constraint(Vertical())
-
-    # The cursor's orientation can only be either vertical or horizontal, but not both
-    E.add_constraint((Horizontal() & ~Vertical()) | (~Horizontal() & Vertical()))
-
-    # Intialize builders with their position and orientation based of off the input
-    x, y = CURSOR_POSITION
-    E.add_constraint(Horizontal() >> (Builder("E", x, y, 0) & Builder("W", x, y, 0)))
-    E.add_constraint(Vertical() >> (Builder("N", x, y, 0) & Builder("S", x, y, 0)))
-
-    # There can only be 2 builders
-    for t in range(MAX_BUILD_TIME):
-        constraint.add_at_most_k(E, 2, [Builder(d, x, y, t) 
-                                        for x in range(CANV_CELLS_WIDTH) 
-                                        for y in range(CANV_CELLS_HEIGHT)
-                                        for d in DIRECTIONS])
-
-    # Initialize balls and ball velocities
-    for i, (x, y, x_vel, y_vel) in enumerate(BALLS):
-        E.add_constraint(BallPosition(i, x, y, 0))
-
-        if x_vel > 0:
-            E.add_constraint(BallVelocityX(i, 0))
-        else:
-            E.add_constraint(~BallVelocityX(i, 0))
-
-        if y_vel > 0:
-            E.add_constraint(BallVelocityY(i, 0))
-        else:
-            E.add_constraint(~BallVelocityY(i, 0))
-    
-    # There can only be the amount of balls entered into the input at 
-    for t in range(MAX_BUILD_TIME):
-        constraint.add_at_most_k(E, len(BALLS), [BallPosition(b, x, y, t) 
-                                        for x in range(CANV_CELLS_WIDTH) 
-                                        for y in range(CANV_CELLS_HEIGHT) 
-                                        for b in range(len(BALLS))])
-
-    # Functionality for balls bouncing
-    for b in range(len(BALLS)):
-        for t in range(MAX_BUILD_TIME):
-            for y in range(CANV_CELLS_HEIGHT):
-                for x in range(CANV_CELLS_WIDTH):
-                    if x > 0:
-                        # A ball bounces off of a captured cell
-                        E.add_constraint(BallPosition(b, x, y, t) & ~BallVelocityX(b, t-1) & CapturedCell(x-1, y, t) >> BallVelocityX(b, t))
-                    else:
-                        # A ball bounces off of the canvas border
-                        E.add_constraint(BallPosition(b, x, y, t) & ~BallVelocityX(b, t-1) >> BallVelocityX(b, t))
-
-                    if x < CANV_CELLS_WIDTH - 1:
-                        E.add_constraint(BallPosition(b, x, y, t) & BallVelocityX(b, t-1) & CapturedCell(x+1, y, t) >> ~BallVelocityX(b, t))
-                    else:
-                        E.add_constraint(BallPosition(b, x, y, t) & BallVelocityX(b, t-1) >> ~BallVelocityX(b, t))
-
-                    if y > 0:
-                        E.add_constraint(BallPosition(b, x, y, t) & ~BallVelocityY(b, t-1) & CapturedCell(x, y-1, t) >> BallVelocityY(b, t))
-                    else:
-                        E.add_constraint(BallPosition(b, x, y, t) & ~BallVelocityY(b, t-1) >> BallVelocityY(b, t))
-                    
-                    if y < CANV_CELLS_HEIGHT - 1:
-                        E.add_constraint(BallPosition(b, x, y, t) & BallVelocityY(b, t-1) & CapturedCell(x, y+1, t) >> ~BallVelocityY(b, t))
-                    else:
-                        E.add_constraint(BallPosition(b, x, y, t) & BallVelocityY(b, t-1) >> ~BallVelocityY(b, t))
-    
-    # When a ball collides with a building cell, the player loses a life
-    for y in range(CANV_CELLS_HEIGHT):
-        for x in range(CANV_CELLS_WIDTH):
-            for t in range(MAX_BUILD_TIME-1):
-                for b in range(len(BALLS)):
-                    for d in DIRECTIONS:
-                        E.add_constraint((BallPosition(b, x, y, t) & BuildingCell(d, x, y, t)) >> LoseLife(t+1))
-                        E.add_constraint(~(BallPosition(b, x, y, t) & BuildingCell(d, x, y, t)) & ~LoseLife(t) >> ~LoseLife(t+1))
-    
-    # If the player will have lost a life at a certain point in time, remember it for the end result
-    for t in range(MAX_BUILD_TIME-1):
-        E.add_constraint(LoseLife(t) >> LoseLife(t+1))
-
-    # Initialize captured cells
-    for y in range(CANV_CELLS_HEIGHT):
-        for x in range(CANV_CELLS_WIDTH):
-            if CANVAS[y][x] == 1:
-                E.add_constraint(CapturedCell(x, y, 0))
-            else:
-                E.add_constraint(~CapturedCell(x, y, 0))
-
-    # A building cell stays until its builder is done, in which case it will turn into a captured cell
-    for t in range(MAX_BUILD_TIME-1):
-        for y in range(CANV_CELLS_HEIGHT):
-            for x in range(CANV_CELLS_WIDTH):
-                for d in DIRECTIONS:
-                    E.add_constraint(BuildingCell(d, x, y, t) & ~BuilderFinished(d, t) >> BuildingCell(d, x, y, t+1))
-                    E.add_constraint(BuildingCell(d, x, y, t) & BuilderFinished(d, t) >> CapturedCell(x, y, t+1))
-
-    # A captured cell stays captured
-    for t in range(MAX_BUILD_TIME-1):
-        for y in range(CANV_CELLS_HEIGHT):
-            for x in range(CANV_CELLS_WIDTH):
-                E.add_constraint(CapturedCell(x, y, t) >> CapturedCell(x, y, t+1))
-
-    # A noncaptured cell stays noncaptured if nothing happens to it
-    for t in range(MAX_BUILD_TIME-1):
-        for y in range(CANV_CELLS_HEIGHT):
-            for x in range(CANV_CELLS_WIDTH):
-                for d in DIRECTIONS:
-                    E.add_constraint(~(BuildingCell(d, x, y, t) & BuilderFinished(d, t)) & ~CapturedCell(x, y, t) >> ~CapturedCell(x, y, t+1))
-    
-    ensure_no_overlap()
-    ball_movement()
-    explore_builders()
-    
-    return E
-
-if __name__ == "__main__":
-    T = theory()
-    # Don't compile until you're finished adding all your constraints!
-    T = T.compile()
-    # After compilation (and only after), you can check some of the properties of your model:
-    print("\nSatisfiable: %s" % T.satisfiable())
-    # print("# Solutions: %d" % count_solutions(T))
-    # print("   Solution: %s" % T.solve())
-    
-    sol = T.solve()
-    # for a,b in sol.items():
-    #     print(a,b)
-
-    # Prints out a mapping of the canvas for each step in time
-    for t in range(MAX_BUILD_TIME):
-        final_map = [[int(sol[f"The cell ({x}, {y}) is captured at time {0}"])
-                    for x in range(CANV_CELLS_WIDTH)] 
-                    for y in range(CANV_CELLS_HEIGHT)]
-        
-        for y in range(len(final_map)):
-            for x in range(len(final_map[0])):
-                for d in DIRECTIONS:
-                    if sol[f"The {d} builder is at cell ({x}, {y}) at time {0}"]:
-                        final_map[y][x] = 2
-
-        print(f'{t=}')
-        print(*final_map, sep='\n')
-        print()
-
-    # Prints out the result of whether or not the player will lose a life
-    if sol[f"The player will have lost a life from creating a line by time {MAX_BUILD_TIME}"]:
-        print("You will lose a life if you create the line")
-    else:
+import argparse
+import sys
+from contextlib import contextmanager
+from functools import wraps
+from math import comb
+
+from inputs import CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS
+# The directions and builder moves are shared with the simulation, so the two can't drift apart
+from simulate import DIRECTIONS, BUILDER_STEPS, ORIENTATION_BUILDERS, line_horizon
+
+CANV_CELLS_WIDTH = len(CANVAS[0])
+CANV_CELLS_HEIGHT = len(CANVAS)
+
+# Only as many time steps as it takes for the line to be done (see simulate.line_horizon())
+MAX_BUILD_TIME = line_horizon(CURSOR_ORIENTATION, CURSOR_POSITION, CANVAS)
+
+from bauhaus import Encoding, proposition, And, Or
+from bauhaus.utils import count_solutions, likelihood
+
+# These two lines make sure a faster SAT solver is used.
+from nnf import config
+
+config.sat_backend = "kissat"
+
+# Encoding that will store all of your constraints
+E = Encoding()
+
+
+class Hashable:
+    '''
+    Propositions are hashed and compared by their key, (class name, *arguments),
+    which interned() sets (along with its hash, so it's only worked out once) when it creates them
+    '''
+    __slots__ = ("_key", "_hash", "_var", "__weakref__")
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, __value: object) -> bool:
+        return isinstance(__value, Hashable) and self._key == __value._key
+
+    def __repr__(self):
+        return str(self)
+
+    def __reduce__(self):
+        # The class's name is taken by interned()'s factory, so propositions are
+        # pickled as a call to it (which interns them again when they're unpickled)
+        return getattr(sys.modules[type(self).__module__], self._key[0]), self._key[1:]
+
+
+# Makes sure each proposition only exists once: creating a proposition with the same
+# arguments again gives back the one that already exists
+def interned(make):
+    table = {}
+
+    @wraps(make)
+    def intern(*args):
+        prop = table.get(args)
+        if prop is None:
+            prop = make(*args)
+            prop._key = (make.__name__,) + args
+            prop._hash = hash(prop._key)
+            table[args] = prop
+        return prop
+
+    intern.table = table
+    return intern
+
+
+########## PROPOSITION CLASSES ##########
+
+@interned
+@proposition(E)
+class Horizontal(Hashable):
+    '''
+    H - This is true if the horizontal orientation is selected
+    '''
+    __slots__ = ()
+
+    def __init__(self):
+        pass
+
+    def __str__(self) -> str:
+        return "The mouse has a horizontal orientation"
+
+
+@interned
+@proposition(E)
+class Vertical(Hashable):
+    '''
+    V - This is true if the vertical orientation is selected
+    '''
+    __slots__ = ()
+
+    def __init__(self):
+        pass
+
+    def __str__(self) -> str:
+        return "The mouse has a vertical orientation"
+
+
+@interned
+@proposition(E)
+class CursorPosition(Hashable):
+    '''
+    M(x, y) - This is true if cell (x, y) is where the cursor/mouse is
+    (i.e. the starting position of where the line is created)
+    '''
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __str__(self) -> str:
+        return f"The cursor is at ({self.x}, {self.y})"
+
+
+@interned
+@proposition(E)
+class BuildingCell(Hashable):
+    '''
+    BC(D, x, y, t) - This is true if cell (x, y) is currently being built by the 
+    builder of direction D at time t (and you'll lose a life if a ball collides with it)
+    '''
+    __slots__ = ("direction", "x", "y", "time")
+
+    def __init__(self, direction, x, y, time):
+        self.direction = direction
+        self.x = x
+        self.y = y
+        self.time = time
+
+    def __str__(self) -> str:
+        return f"The cell at ({self.x}, {self.y}) is currently being built by the {self.direction} builder at time {self.time}"
+
+
+@interned
+@proposition(E)
+class CapturedCell(Hashable):
+    '''
+    C(x, y, t) - This is true if cell (x, y) is captured (i.e. the black cells) at time t
+    '''
+    __slots__ = ("x", "y", "time")
+
+    def __init__(self, x, y, time):
+        self.x = x
+        self.y = y
+        self.time = time
+
+    def __str__(self) -> str:
+        return f"The cell ({self.x}, {self.y}) is captured at time {self.time}"
+
+
+@interned
+@proposition(E)
+class BallPosition(Hashable):
+    '''
+    P(i, x, y, t) - This is true if ball i's position is at cell (x, y) at time t
+    '''
+    __slots__ = ("ball_id", "x", "y", "time")
+
+    def __init__(self, ball_id, x, y, time):
+        self.ball_id = ball_id
+        self.x = x
+        self.y = y
+        self.time = time
+
+    def __str__(self) -> str:
+        return f"Ball {self.ball_id} is at ({self.x}, {self.y}) at time {self.time}"
+
+
+@interned
+@proposition(E)
+class BallVelocityX(Hashable):
+    '''
+    Vx(i, t) - This is true if ball i is currently moving in the positive X direction at time t
+    '''
+    __slots__ = ("ball_id", "time")
+
+    def __init__(self, ball_id, time):
+        self.ball_id = ball_id
+        self.time = time
+
+    def __str__(self) -> str:
+        return f"Ball {self.ball_id} is moving in the positive X direction at time {self.time}"
+
+
+@interned
+@proposition(E)
+class BallVelocityY(Hashable):
+    '''
+    Vy(i, t) - This is true if ball i is currently moving in the positive Y direction at time t
+    '''
+    __slots__ = ("ball_id", "time")
+
+    def __init__(self, ball_id, time):
+        self.ball_id = ball_id
+        self.time = time
+
+    def __str__(self) -> str:
+        return f"Ball {self.ball_id} is moving in the positive Y direction at time {self.time}"
+
+
+@interned
+@proposition(E)
+class BallStuck(Hashable):
+    '''
+    S(i, t) - This is true if ball i is at the same cell at time t as it was at time t-1
+    (i.e. it ran head on into a captured cell instead of moving)
+    '''
+    __slots__ = ("ball_id", "time")
+
+    def __init__(self, ball_id, time):
+        self.ball_id = ball_id
+        self.time = time
+
+    def __str__(self) -> str:
+        return f"Ball {self.ball_id} didn't move between time {self.time - 1} and time {self.time}"
+
+
+@interned
+@proposition(E)
+class Builder(Hashable):
+    '''
+    B(D, x, y, t) - This is true if the builder of direction D (can be N, E, S, W) is at cell (x, y) at time t
+    '''
+    __slots__ = ("direction", "x", "y", "time")
+
+    def __init__(self, direction, x, y, time):
+        self.direction = direction
+        self.x = x
+        self.y = y
+        self.time = time
+
+    def __str__(self) -> str:
+        return f"The {self.direction} builder is at cell ({self.x}, {self.y}) at time {self.time}"
+
+
+@interned
+@proposition(E)
+class BuilderFinished(Hashable):
+    '''
+    BF(D, t) - This is true if the builder of direction D is finished building at time t 
+    '''
+    __slots__ = ("direction", "time")
+
+    def __init__(self, direction, time):
+        self.direction = direction
+        self.time = time
+
+    def __str__(self) -> str:
+        return f"The {self.direction} builder is finished building at time {self.time}"
+
+
+@interned
+@proposition(E)
+class CounterBit(Hashable):
+    '''
+    R(g, i, j) - This is true if at least j of the first i propositions in the cardinality
+    constraint g are true (see at_most_k())
+    '''
+    __slots__ = ("group", "index", "count")
+
+    def __init__(self, group, index, count):
+        self.group = group
+        self.index = index
+        self.count = count
+
+    def __str__(self) -> str:
+        return f"At least {self.count} of the first {self.index} propositions in {self.group} are true"
+
+
+@interned
+@proposition(E)
+class LoseLife(Hashable):
+    '''
+    L - This is true if the player has lost a life from creating a line at time t or before
+    '''
+    __slots__ = ("time",)
+
+    def __init__(self, time):
+        self.time = time
+
+    def __str__(self) -> str:
+        return f"The player will have lost a life from creating a line by time {self.time}"
+
+
+########## PROPOSITION INSTANCES ##########
+horizontal_prop = Horizontal()
+vertical_prop = Vertical()
+
+cursor_pos_props = []
+for y in range(CANV_CELLS_HEIGHT):
+    for x in range(CANV_CELLS_WIDTH):
+        cursor_pos_props.append(CursorPosition(x, y))
+
+captured_cell_props = []
+building_cell_props = []
+for t in range(MAX_BUILD_TIME):
+    for y in range(CANV_CELLS_HEIGHT):
+        for x in range(CANV_CELLS_WIDTH):
+            captured_cell_props.append(CapturedCell(x, y, t))
+            for d in DIRECTIONS:
+                building_cell_props.append(BuildingCell(d, x, y, t))
+
+ball_pos_props = []
+ball_vel_x_props = []
+ball_vel_y_props = []
+ball_stuck_props = []
+for b in range(len(BALLS)):
+    for t in range(MAX_BUILD_TIME):
+        ball_vel_x_props.append(BallVelocityX(b, t))
+        ball_vel_y_props.append(BallVelocityY(b, t))
+        ball_stuck_props.append(BallStuck(b, t))
+
+        for y in range(CANV_CELLS_HEIGHT):
+            for x in range(CANV_CELLS_WIDTH):
+                ball_pos_props.append(BallPosition(b, x, y, t))
+
+builder_props = []
+for d in DIRECTIONS:
+    for t in range(MAX_BUILD_TIME):
+        for y in range(CANV_CELLS_HEIGHT):
+            for x in range(CANV_CELLS_WIDTH):
+                builder_props.append(Builder(d, x, y, t))
+
+lose_props = []
+for t in range(MAX_BUILD_TIME):
+    lose_props.append(LoseLife(t))
+
+
+########## CONFIGURATION ##########
+
+# Swap in a different set of inputs (instead of the ones from inputs.py) and
+# clear out any constraints left in E from a previous call to theory().
+# Without a max_build_time, the horizon is however long the line takes to be done.
+def configure(cursor_orientation, cursor_position, balls, canvas, max_build_time=None):
+    global CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS
+    global CANV_CELLS_WIDTH, CANV_CELLS_HEIGHT, MAX_BUILD_TIME
+
+    CURSOR_ORIENTATION = cursor_orientation
+    CURSOR_POSITION = tuple(cursor_position)
+    BALLS = [tuple(ball) for ball in balls]
+    CANVAS = canvas
+
+    CANV_CELLS_WIDTH = len(CANVAS[0])
+    CANV_CELLS_HEIGHT = len(CANVAS)
+    MAX_BUILD_TIME = max_build_time if max_build_time is not None else line_horizon(CURSOR_ORIENTATION, CURSOR_POSITION, CANVAS)
+
+    E.clear_constraints()
+    E._custom_constraints = set()
+
+
+########## REACHABILITY ##########
+
+# When the encoding is pruned, this holds the states that are reachable from the
+# inputs, and propositions are only created for those states
+REACHABLE = None
+
+
+class Reachable:
+    '''
+    The states that are reachable from the inputs:
+      ball_cells[b][t] - the cells that ball b could be at by time t
+      rays[d]          - the cells (in order) that the builder of direction D could pass through
+      line_cells       - the only cells that could go from noncaptured to captured
+    '''
+    def __init__(self, ball_cells, rays):
+        self.ball_cells = ball_cells
+        self.rays = rays
+        self.line_cells = {cell for ray in rays.values() for cell in ray}
+
+
+def find_reachable_states():
+    def free(x, y):
+        return 0 <= x < CANV_CELLS_WIDTH and 0 <= y < CANV_CELLS_HEIGHT and CANVAS[y][x] == 0
+
+    # Builders only ever move in a straight line away from the cursor, one cell per
+    # step in time, until they run into a captured cell or the canvas border
+    rays = {}
+    for d in ORIENTATION_BUILDERS[CURSOR_ORIENTATION]:
+        dx, dy = BUILDER_STEPS[d]
+        x, y = CURSOR_POSITION
+        rays[d] = [(x, y)]
+        while len(rays[d]) < MAX_BUILD_TIME and free(x + dx, y + dy):
+            x, y = x + dx, y + dy
+            rays[d].append((x, y))
+
+    # A ball either moves diagonally or stays where it is, and it can never move onto
+    # a cell that was captured from the start
+    ball_cells = []
+    for x, y, _, _ in BALLS:
+        cells = [{(x, y)}]
+        for t in range(MAX_BUILD_TIME):
+            cells.append(cells[-1] | {(x + dx, y + dy)
+                                      for x, y in cells[-1]
+                                      for dx in (-1, 1)
+                                      for dy in (-1, 1)
+                                      if free(x + dx, y + dy)})
+        ball_cells.append(cells)
+
+    return Reachable(ball_cells, rays)
+
+
+# The cells that each kind of proposition needs to be created for at time t
+def canvas_cells():
+    return [(x, y) for y in range(CANV_CELLS_HEIGHT) for x in range(CANV_CELLS_WIDTH)]
+
+def ball_cells(b, t):
+    return canvas_cells() if REACHABLE is None else REACHABLE.ball_cells[b][t]
+
+def builder_cells(d, t):
+    if REACHABLE is None:
+        return canvas_cells()
+    ray = REACHABLE.rays.get(d, [])
+    return ray[t:t+1]
+
+def building_cells(d, t):
+    return canvas_cells() if REACHABLE is None else REACHABLE.rays.get(d, [])[:t+1]
+
+def line_cells():
+    return canvas_cells() if REACHABLE is None else REACHABLE.line_cells
+
+def cursor_cells():
+    return canvas_cells() if REACHABLE is None else [CURSOR_POSITION]
+
+def on_canvas(x, y):
+    return 0 <= x < CANV_CELLS_WIDTH and 0 <= y < CANV_CELLS_HEIGHT
+
+
+# The propositions for a state, or True/False if the pruned encoding already knows its value
+def captured(x, y, t):
+    # Past the canvas border acts the same as a captured cell
+    if not on_canvas(x, y):
+        return True
+    if REACHABLE is None or (x, y) in REACHABLE.line_cells:
+        return CapturedCell(x, y, t)
+    return CANVAS[y][x] == 1
+
+def ball_position(b, x, y, t):
+    if not on_canvas(x, y):
+        return False
+    if REACHABLE is None or (x, y) in REACHABLE.ball_cells[b][t]:
+        return BallPosition(b, x, y, t)
+    return False
+
+def builder(d, x, y, t):
+    if not on_canvas(x, y):
+        return False
+    if REACHABLE is None or (x, y) in builder_cells(d, t):
+        return Builder(d, x, y, t)
+    return False
+
+def building_cell(d, x, y, t):
+    if not on_canvas(x, y):
+        return False
+    if REACHABLE is None or (x, y) in building_cells(d, t):
+        return BuildingCell(d, x, y, t)
+    return False
+
+def builder_finished(d, t):
+    if REACHABLE is None or d in REACHABLE.rays:
+        return BuilderFinished(d, t)
+    return False
+
+# The orientation that creates the builder of direction d
+def orientation(d):
+    return Horizontal() if d in ORIENTATION_BUILDERS["H"] else Vertical()
+
+# Ball b moving in the sign_x / sign_y direction at time t
+def velocity_x(b, t, sign_x):
+    return BallVelocityX(b, t) if sign_x > 0 else ~BallVelocityX(b, t)
+
+def velocity_y(b, t, sign_y):
+    return BallVelocityY(b, t) if sign_y > 0 else ~BallVelocityY(b, t)
+
+
+# Building constraints out of propositions that might be known to be True/False
+def neg(literal):
+    return (not literal) if isinstance(literal, bool) else ~literal
+
+def all_of(*literals):
+    if any(literal is False for literal in literals):
+        return False
+    literals = [literal for literal in literals if literal is not True]
+    if not literals:
+        return True
+    return literals[0] if len(literals) == 1 else And(literals)
+
+def any_of(*literals):
+    if any(literal is True for literal in literals):
+        return True
+    literals = [literal for literal in literals if literal is not False]
+    if not literals:
+        return False
+    return literals[0] if len(literals) == 1 else Or(literals)
+
+# When this is set (see dimacs.py), constraints are streamed out to it instead of being added to E
+DIMACS_WRITER = None
+
+def implies(condition, result):
+    if condition is False or result is True:
+        return
+    if condition is True and result is False:
+        raise ValueError("The inputs contradict the theory")
+    if PROFILE is not None:
+        PROFILE.pending.append((condition, result))
+    if DIMACS_WRITER is not None:
+        DIMACS_WRITER.add(condition, result)
+    elif condition is True:
+        E.add_constraint(result)
+    elif result is False:
+        E.add_constraint(~condition)
+    else:
+        E.add_constraint(condition >> result)
+
+def require(literal):
+    implies(True, literal)
+
+# How many constraints have been added so far
+def constraint_count():
+    return len(E._custom_constraints) if DIMACS_WRITER is None else DIMACS_WRITER.clauses
+
+# When this is set to a profiler.Profiler, each family of constraints records how many
+# constraints and propositions it added, and how long that took
+PROFILE = None
+
+@contextmanager
+def family(name):
+    if PROFILE is None:
+        yield
+    else:
+        with PROFILE.family(name, constraint_count):
+            yield
+
+
+########## CARDINALITY ##########
+
+# The clauses that the cardinality constraints of the last theory() added at each time step,
+# next to the clauses that bauhaus' add_at_most_k would have added for the same constraint:
+# {"builders"/"balls": [(clauses, bauhaus_clauses) for each t]}
+CARDINALITY_CLAUSES = {}
+
+def at_most_k(k, literals, group):
+    '''
+    Adds "at most k of the literals are true" as a sequential counter (Sinz, 2005), which
+    takes O(n*k) clauses where bauhaus takes one for every combination of k+1 literals.
+    The counter bits are defined exactly (not just bounded), so they don't add any models.
+    Returns the number of clauses added.
+    '''
+    literals = [literal for literal in literals if literal is not False]
+    before = constraint_count()
+
+    # Whether at least j of the first i literals are true
+    def counter(i, j):
+        if j == 0:
+            return True
+        if j > i:
+            return False
+        return CounterBit(group, i, j)
+
+    for i in range(1, len(literals)):
+        for j in range(1, min(i, k) + 1):
+            implies(counter(i-1, j), counter(i, j))
+            implies(all_of(literals[i-1], counter(i-1, j-1)), counter(i, j))
+            implies(counter(i, j), any_of(counter(i-1, j), literals[i-1]))
+            implies(counter(i, j), any_of(counter(i-1, j), counter(i-1, j-1)))
+
+    for i in range(1, len(literals) + 1):
+        implies(all_of(literals[i-1], counter(i-1, k)), False)
+
+    return constraint_count() - before
+
+def exactly_one(literals, group):
+    before = constraint_count()
+    at_most_k(1, literals, group)
+    require(any_of(*literals))
+    return constraint_count() - before
+
+# The number of clauses bauhaus' add_at_most_k(k) uses for n propositions
+def bauhaus_clauses(n, k):
+    return comb(n, k+1) if n > k else 0
+
+
+########## EXPLORING THE MODEL ##########
+
+# The position of a ball cannot coincide with the position of a captured cell
+# (unless the ball already broke the line it was sitting on, and so the player lost a life)
+def ensure_no_overlap():
+        for i in range(len(BALLS)):
+            for t in range(MAX_BUILD_TIME):
+                for x, y in ball_cells(i, t):
+                    implies(all_of(ball_position(i, x, y, t), ~LoseLife(t)), neg(captured(x, y, t)))
+
+# Balls move based on their velocities after a step in time to next cell if that cell isn't captured
+# (including cells that get captured during that step)
+def ball_movement():
+    for b in range(len(BALLS)):
+        for t in range(MAX_BUILD_TIME-1):
+            for x, y in ball_cells(b, t):
+                implies(all_of(ball_position(b, x, y, t), BallVelocityX(b, t), BallVelocityY(b, t), neg(captured(x+1, y+1, t+1))), ball_position(b, x+1, y+1, t+1))
+                implies(all_of(ball_position(b, x, y, t), ~BallVelocityX(b, t), BallVelocityY(b, t), neg(captured(x-1, y+1, t+1))), ball_position(b, x-1, y+1, t+1))
+                implies(all_of(ball_position(b, x, y, t), BallVelocityX(b, t), ~BallVelocityY(b, t), neg(captured(x+1, y-1, t+1))), ball_position(b, x+1, y-1, t+1))
+                implies(all_of(ball_position(b, x, y, t), ~BallVelocityX(b, t), ~BallVelocityY(b, t), neg(captured(x-1, y-1, t+1))), ball_position(b, x-1, y-1, t+1))
+
+                # Otherwise the ball stays where it is
+                for sign_x in (1, -1):
+                    for sign_y in (1, -1):
+                        implies(all_of(ball_position(b, x, y, t), velocity_x(b, t, sign_x), velocity_y(b, t, sign_y), captured(x+sign_x, y+sign_y, t+1)),
+                                ball_position(b, x, y, t+1))
+
+        # A ball is only somewhere if it moved there or stayed there
+        for t in range(MAX_BUILD_TIME-1):
+            for x, y in ball_cells(b, t+1):
+                sources = []
+                for sign_x in (1, -1):
+                    for sign_y in (1, -1):
+                        sources.append(all_of(ball_position(b, x-sign_x, y-sign_y, t), velocity_x(b, t, sign_x), velocity_y(b, t, sign_y),
+                                              neg(captured(x, y, t+1))))
+                        sources.append(all_of(ball_position(b, x, y, t), velocity_x(b, t, sign_x), velocity_y(b, t, sign_y),
+                                              captured(x+sign_x, y+sign_y, t+1)))
+                implies(ball_position(b, x, y, t+1), any_of(*sources))
+
+        # Remember whether the ball stayed where it was
+        require(~BallStuck(b, 0))
+        for t in range(1, MAX_BUILD_TIME):
+            stayed = [all_of(ball_position(b, x, y, t-1), ball_position(b, x, y, t)) for x, y in ball_cells(b, t-1)]
+            for stay in stayed:
+                implies(stay, BallStuck(b, t))
+            implies(BallStuck(b, t), any_of(*stayed))
+
+# Balls bounce off of the captured cells (and canvas border) they're moving towards, and
+# otherwise keep moving the same way
+def ball_bouncing():
+    for b in range(len(BALLS)):
+        for t in range(1, MAX_BUILD_TIME):
+            for x, y in ball_cells(b, t):
+                if x > 0:
+                    # A ball bounces off of a captured cell
+                    implies(all_of(ball_position(b, x, y, t), ~BallVelocityX(b, t-1), captured(x-1, y, t)), BallVelocityX(b, t))
+                else:
+                    # A ball bounces off of the canvas border
+                    implies(all_of(ball_position(b, x, y, t), ~BallVelocityX(b, t-1)), BallVelocityX(b, t))
+
+                if x < CANV_CELLS_WIDTH - 1:
+                    implies(all_of(ball_position(b, x, y, t), BallVelocityX(b, t-1), captured(x+1, y, t)), ~BallVelocityX(b, t))
+                else:
+                    implies(all_of(ball_position(b, x, y, t), BallVelocityX(b, t-1)), ~BallVelocityX(b, t))
+
+                if y > 0:
+                    implies(all_of(ball_position(b, x, y, t), ~BallVelocityY(b, t-1), captured(x, y-1, t)), BallVelocityY(b, t))
+                else:
+                    implies(all_of(ball_position(b, x, y, t), ~BallVelocityY(b, t-1)), BallVelocityY(b, t))
+                
+                if y < CANV_CELLS_HEIGHT - 1:
+                    implies(all_of(ball_position(b, x, y, t), BallVelocityY(b, t-1), captured(x, y+1, t)), ~BallVelocityY(b, t))
+                else:
+                    implies(all_of(ball_position(b, x, y, t), BallVelocityY(b, t-1)), ~BallVelocityY(b, t))
+
+                for sign_x in (1, -1):
+                    for sign_y in (1, -1):
+                        moving = all_of(ball_position(b, x, y, t), velocity_x(b, t-1, sign_x), velocity_y(b, t-1, sign_y))
+                        bounce_x = captured(x+sign_x, y, t)
+                        bounce_y = captured(x, y+sign_y, t)
+
+                        # A ball keeps its velocity along any axis it didn't bounce on
+                        implies(all_of(moving, neg(bounce_x), bounce_y), velocity_x(b, t, sign_x))
+                        implies(all_of(moving, bounce_x, neg(bounce_y)), velocity_y(b, t, sign_y))
+                        implies(all_of(moving, neg(bounce_x), neg(bounce_y), ~BallStuck(b, t-1)),
+                                all_of(velocity_x(b, t, sign_x), velocity_y(b, t, sign_y)))
+
+                        # A ball that hit a corner head on (and nothing else) bounces straight back
+                        implies(all_of(moving, neg(bounce_x), neg(bounce_y), BallStuck(b, t-1)),
+                                all_of(velocity_x(b, t, -sign_x), velocity_y(b, t, -sign_y)))
+
+# The full exploration of how builders could move and create building cells 
+def explore_builders():
+    # Intialize builders with their position and orientation based of off the cursor
+    for x, y in cursor_cells():
+        implies(all_of(Horizontal(), CursorPosition(x, y)), all_of(builder("E", x, y, 0), builder("W", x, y, 0)))
+        implies(all_of(Vertical(), CursorPosition(x, y)), all_of(builder("N", x, y, 0), builder("S", x, y, 0)))
+
+    # A builder only starts at the cursor
+    for d in DIRECTIONS:
+        for x, y in builder_cells(d, 0):
+            implies(builder(d, x, y, 0), all_of(orientation(d), CursorPosition(x, y)))
+
+    # A builder creates a building cell and moves to the next cell after a step in time
+    for t in range(MAX_BUILD_TIME-1):
+        for x, y in builder_cells("N", t):
+            if y > 0:
+                # The builder will move on to the next cell if it is empty
+                implies(all_of(builder("N", x, y, t), neg(captured(x, y-1, t))), builder("N", x, y-1, t+1))
+
+                # The builder will finish building if it runs into a captured cell
+                implies(all_of(builder("N", x, y, t), captured(x, y-1, t)), builder_finished("N", t+1))
+            else:
+
+                # The builder finishes building if it runs into the canvas border
+                implies(builder("N", x, y, t), builder_finished("N", t+1))
+
+        for x, y in builder_cells("S", t):
+            if y < CANV_CELLS_HEIGHT - 1:
+                implies(all_of(builder("S", x, y, t), neg(captured(x, y+1, t))), builder("S", x, y+1, t+1))
+                implies(all_of(builder("S", x, y, t), captured(x, y+1, t)), builder_finished("S", t+1))
+            else:
+                implies(builder("S", x, y, t), builder_finished("S", t+1))
+
+        for x, y in builder_cells("W", t):
+            if x > 0:
+                implies(all_of(builder("W", x, y, t), neg(captured(x-1, y, t))), builder("W", x-1, y, t+1))
+                implies(all_of(builder("W", x, y, t), captured(x-1, y, t)), builder_finished("W", t+1))
+            else:
+                implies(builder("W", x, y, t), builder_finished("W", t+1))
+
+        for x, y in builder_cells("E", t):
+            if x < CANV_CELLS_WIDTH - 1:
+                implies(all_of(builder("E", x, y, t), neg(captured(x+1, y, t))), builder("E", x+1, y, t+1))
+                implies(all_of(builder("E", x, y, t), captured(x+1, y, t)), builder_finished("E", t+1))
+            else:
+                implies(builder("E", x, y, t), builder_finished("E", t+1))
+
+        for d in DIRECTIONS:
+            dx, dy = BUILDER_STEPS[d]
+
+            # A builder is only somewhere if it moved there from the cell behind it
+            for x, y in builder_cells(d, t+1):
+                implies(builder(d, x, y, t+1), all_of(builder(d, x-dx, y-dy, t), neg(captured(x, y, t))))
+
+            # A builder stays finished, and only finishes if it ran into a captured cell (or the canvas border)
+            implies(builder_finished(d, t), builder_finished(d, t+1))
+            implies(builder_finished(d, t+1), any_of(builder_finished(d, t), *[all_of(builder(d, x, y, t), captured(x+dx, y+dy, t))
+                                                                               for x, y in builder_cells(d, t)]))
+
+    for d in DIRECTIONS:
+        require(neg(builder_finished(d, 0)))
+
+    for t in range(MAX_BUILD_TIME):
+        for d in DIRECTIONS:
+            for x, y in builder_cells(d, t):
+                # Each builder creates a building cell at its location
+                implies(builder(d, x, y, t), building_cell(d, x, y, t))
+
+            # A building cell only exists if its builder created it, or it was already being built
+            for x, y in building_cells(d, t):
+                kept = all_of(building_cell(d, x, y, t-1), neg(builder_finished(d, t-1))) if t > 0 else False
+                implies(building_cell(d, x, y, t), any_of(kept, builder(d, x, y, t)))
+
+########## CONSTRAINTS ##########
+
+# The (proposition, value) pairs that pin down the state at time 0 to the given inputs
+def initial_state(cursor_orientation, cursor_position, balls, canvas):
+    state = [(Horizontal(), cursor_orientation == "H"),
+             (Vertical(), cursor_orientation == "V")]
+
+    for x, y in cursor_cells():
+        state.append((CursorPosition(x, y), (x, y) == tuple(cursor_position)))
+
+    for x, y in line_cells():
+        state.append((captured(x, y, 0), canvas[y][x] == 1))
+
+    for i, (ball_x, ball_y, x_vel, y_vel) in enumerate(balls):
+        for x, y in ball_cells(i, 0):
+            state.append((ball_position(i, x, y, 0), (x, y) == (ball_x, ball_y)))
+        # A velocity of None is uncertain, and left free
+        if x_vel is not None:
+            state.append((BallVelocityX(i, 0), x_vel > 0))
+        if y_vel is not None:
+            state.append((BallVelocityY(i, 0), y_vel > 0))
+
+    return state
+
+
+# How the game plays out from any state at time 0 (this doesn't depend on the inputs)
+def dynamics():
+    with family("lose_life"):
+        # Intitialize the lose life proposition to be false at time 0:
+        require(~LoseLife(0))
+
+        # When a ball collides with a building cell, the player loses a life
+        collisions = [[all_of(ball_position(b, x, y, t), building_cell(d, x, y, t))
+                       for b in range(len(BALLS))
+                       for d in DIRECTIONS
+                       for x, y in building_cells(d, t)]
+                      for t in range(MAX_BUILD_TIME-1)]
+        for t in range(MAX_BUILD_TIME-1):
+            for collision in collisions[t]:
+                implies(collision, LoseLife(t+1))
+
+        # If the player will have lost a life at a certain point in time, remember it for the end result
+        for t in range(MAX_BUILD_TIME-1):
+            implies(LoseLife(t), LoseLife(t+1))
+
+        # Otherwise, the player only loses a life if some ball collided with some building cell
+        for t in range(MAX_BUILD_TIME-1):
+            implies(LoseLife(t+1), any_of(LoseLife(t), *collisions[t]))
+
+    with family("orientation"):
+        # The cursor's orientation can only be either vertical or horizontal, but not both
+        implies(Horizontal(), ~Vertical())
+        implies(~Horizontal(), Vertical())
+
+    with family("building_cells"):
+        # A building cell stays until its builder is done, in which case it will turn into a captured cell
+        for t in range(MAX_BUILD_TIME-1):
+            for d in DIRECTIONS:
+                for x, y in building_cells(d, t):
+                    implies(all_of(building_cell(d, x, y, t), neg(builder_finished(d, t))), building_cell(d, x, y, t+1))
+                    implies(all_of(building_cell(d, x, y, t), builder_finished(d, t)), captured(x, y, t+1))
+
+    with family("captured_cells"):
+        # A captured cell stays captured
+        for t in range(MAX_BUILD_TIME-1):
+            for x, y in line_cells():
+                implies(captured(x, y, t), captured(x, y, t+1))
+
+        # A noncaptured cell stays noncaptured unless one of the builders finished building it
+        for t in range(MAX_BUILD_TIME-1):
+            for x, y in line_cells():
+                implies(captured(x, y, t+1), any_of(captured(x, y, t), *[all_of(building_cell(d, x, y, t), builder_finished(d, t))
+                                                                         for d in DIRECTIONS]))
+
+    with family("ensure_no_overlap"):
+        ensure_no_overlap()
+    with family("ball_movement"):
+        ball_movement()
+    with family("ball_bouncing"):
+        ball_bouncing()
+    with family("explore_builders"):
+        explore_builders()
+
+
+# With pruned=True, only the propositions and constraints for states that are
+# reachable from the inputs are created (everything else is known ahead of time)
+def theory(pruned=False):
+    global REACHABLE
+    with family("reachability"):
+        REACHABLE = find_reachable_states() if pruned else None
+
+    with family("initial_state"):
+        # Initialize the cursor, captured cells, balls and ball velocities based of off the input
+        for prop, value in initial_state(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS):
+            require(prop if value else neg(prop))
+
+    CARDINALITY_CLAUSES.clear()
+    CARDINALITY_CLAUSES.update(builders=[], balls=[])
+
+    with family("builder_cardinality"):
+        # There can only be 2 builders: at most one of each direction that the cursor's orientation creates
+        for t in range(MAX_BUILD_TIME):
+            before = constraint_count()
+            for d in DIRECTIONS:
+                builders = [builder(d, x, y, t) for x, y in builder_cells(d, t)]
+                for prop in builders:
+                    implies(prop, orientation(d))
+                at_most_k(1, builders, ("builder", d, t))
+            all_builders = sum(len(builder_cells(d, t)) for d in DIRECTIONS)
+            CARDINALITY_CLAUSES["builders"].append((constraint_count() - before, bauhaus_clauses(all_builders, 2)))
+
+    with family("ball_cardinality"):
+        # There can only be the amount of balls entered into the input: each ball is at exactly one cell
+        for t in range(MAX_BUILD_TIME):
+            clauses = sum(exactly_one([ball_position(b, x, y, t) for x, y in ball_cells(b, t)], ("ball", b, t))
+                          for b in range(len(BALLS)))
+            all_positions = sum(len(ball_cells(b, t)) for b in range(len(BALLS)))
+            CARDINALITY_CLAUSES["balls"].append((clauses, bauhaus_clauses(all_positions, len(BALLS))))
+
+    dynamics()
+    
+    return E
+
+
+# The dynamics on their own, for every cursor position and orientation, captured cells and
+# ball positions and velocities, so that the inputs can be passed in later as assumptions
+# (see incremental.py). This only looks at the canvas size, the number of balls and the horizon.
+def parametric_theory():
+    global REACHABLE
+    REACHABLE = None
+
+    dynamics()
+
+    return E
+
+
+# The dynamics for the canvas run.py is configured with, where the cursor's position and
+# orientation and the balls' starting cells and velocities are left free (but each ball is
+# at exactly one cell, and the cursor is at exactly one cell), so that they can be passed in
+# later by conditioning a compiled circuit (see ddnnf.py)
+def canvas_theory():
+    global REACHABLE
+    REACHABLE = None
+
+    for x, y in canvas_cells():
+        require(captured(x, y, 0) if CANVAS[y][x] == 1 else neg(captured(x, y, 0)))
+
+    exactly_one([CursorPosition(x, y) for x, y in cursor_cells()], ("cursor",))
+    for b in range(len(BALLS)):
+        exactly_one([ball_position(b, x, y, 0) for x, y in ball_cells(b, 0)], ("ball", b, 0))
+
+    dynamics()
+
+    return E
+
+
+# Solves the theory with longer and longer horizons (doubling it each time) until both
+# builders have finished by the second last step, after which nothing can change the
+# verdict any more. This doesn't need to know how long the line takes ahead of time.
+def solve_deepening(pruned=False, horizon=2):
+    while True:
+        configure(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS, horizon)
+        sol = theory(pruned).compile().solve()
+        if all(sol.get(BuilderFinished(d, horizon-2), False) for d in ORIENTATION_BUILDERS[CURSOR_ORIENTATION]):
+            return sol
+        horizon *= 2
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Figure out whether creating a line with the inputs from inputs.py loses a life")
+    parser.add_argument("--sat", action="store_true",
+                        help="solve the SAT encoding instead of running the (much faster) simulation")
+    parser.add_argument("--pruned", action="store_true",
+                        help="only encode the states that are reachable from the inputs")
+    parser.add_argument("--deepen", action="store_true",
+                        help="with --sat, double the horizon until the line is done instead of working it out up front")
+    parser.add_argument("--export", metavar="FILE",
+                        help="also save the timeline as NumPy arrays to a .npz file (see timeline.py)")
+    parser.add_argument("--likelihood", action="store_true",
+                        help="work out the chance of losing a life, where the velocities that are None in inputs.py could be either way")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="with --sat, record the constraints, propositions and time each family of constraints takes, and how long compiling and solving take, and write it out as JSON")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="with --profile, also record the peak memory of each family (this makes encoding a few times slower)")
+    parser.add_argument("--scenarios", metavar="FILE",
+                        help="take the inputs from a scenario file (see scenarios.py) instead of inputs.py")
+    parser.add_argument("--index", type=int, default=0, help="with --scenarios, which scenario in the file to use")
+    args = parser.parse_args()
+
+    # Swaps in a scenario from a scenario file for the one from inputs.py
+    if args.scenarios:
+        from scenarios import load, unpack
+        configure(*unpack(load(args.scenarios)[args.index]))
+
+    # Velocities that are None are uncertain, and only --likelihood can weigh them up
+    if not args.likelihood and any(x_vel is None or y_vel is None for _, _, x_vel, y_vel in BALLS):
+        parser.error("some velocities are uncertain (None), so add --likelihood to work out the chance of losing a life")
+
+    # Compiles the theory with the uncertain velocities left free once, and weighs the
+    # solutions that lose a life against all of them (see ddnnf.py)
+    if args.likelihood:
+        from ddnnf import compile_theory
+        circuit = compile_theory(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS, pruned=args.pruned)
+        probability = circuit.lose_life_probability(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS)
+        print("You will lose a life if you create the line with a chance of %.1f%%" % (100 * probability))
+        sys.exit()
+
+    # The inputs are fully determined, so by default we simulate them forward in
+    # time instead of compiling and solving the theory
+    if not args.sat:
+        from simulate import simulate, print_simulation
+        simulation = simulate(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS, MAX_BUILD_TIME)
+        print_simulation(simulation)
+        if args.export:
+            from timeline import from_simulation
+            from_simulation(simulation, len(BALLS)).save(args.export)
+        sys.exit()
+
+    from timeline import TimelineIndex, render
+
+    # Without a profile, phases are just called
+    phase = lambda name, function: function()
+    if args.profile:
+        from profiler import Profiler
+        PROFILE = Profiler(memory=args.profile_memory)
+        phase = PROFILE.phase
+
+    if args.deepen:
+        sol = phase("solve_deepening", lambda: solve_deepening(args.pruned))
+    else:
+        T = phase("theory", lambda: theory(args.pruned))
+        # Don't compile until you're finished adding all your constraints!
+        T = phase("compile", T.compile)
+        # After compilation (and only after), you can check some of the properties of your model:
+        print("\nSatisfiable: %s" % phase("satisfiable", T.satisfiable))
+        # print("# Solutions: %d" % count_solutions(T))
+        # print("   Solution: %s" % T.solve())
+
+        sol = phase("solve", T.solve)
+
+    if args.profile:
+        PROFILE.print()
+        PROFILE.write(args.profile)
+    # for a,b in sol.items():
+    #     print(a,b)
+
+    # Decodes the solution into arrays in one pass and prints out a mapping of the canvas
+    # for each step in time (cells that the pruned encoding left out keep their value from the inputs)
+    timeline = TimelineIndex(sys.modules[__name__]).decode(sol)
+    print(render(timeline))
+    if args.export:
+        timeline.save(args.export)
+
+    # Prints out the result of whether or not the player will lose a life
+    if timeline.lose_life[-1]:
+        print("You will lose a life if you create the line")
+    else:
         print("You won't lose a life if you create the line")
\ No newline at end of file
@@ -0,0 +1,96 @@
+'''
+A whole-board safety map: whether creating a line loses a life for every empty
+cell the cursor could be at, in both orientations, on the canvas and balls from
+inputs.py.
+
+The balls don't notice a line until part of it is captured, so their
+trajectory without a line is worked out once and shared by every query. The
+queries are spread across a process pool, either simulated (the default) or
+answered by an incremental SAT session per process (--sat).
+'''
+import argparse
+import json
+import os
+from multiprocessing import Pool
+
+from inputs import BALLS, CANVAS
+from simulate import ball_trajectory, simulate
+
+ORIENTATIONS = ("H", "V")
+
+# Each worker process keeps the inputs (and its SAT session) between queries
+_worker = {}
+
+
+def _start_worker(balls, canvas, max_build_time, ball_frames, sat):
+    _worker.update(balls=balls, canvas=canvas, max_build_time=max_build_time, ball_frames=ball_frames, session=None)
+    if sat:
+        from incremental import Session
+        _worker["session"] = Session(len(canvas[0]), len(canvas), len(balls), max_build_time)
+
+
+def _lose_life(query):
+    cursor_orientation, cursor_position = query
+    if _worker["session"] is not None:
+        return _worker["session"].lose_life(cursor_orientation, cursor_position, _worker["balls"], _worker["canvas"])
+    return simulate(cursor_orientation, cursor_position, _worker["balls"], _worker["canvas"],
+                    _worker["max_build_time"], _worker["ball_frames"]).lose_life
+
+
+def safety_map(balls=BALLS, canvas=CANVAS, max_build_time=None, processes=None, sat=False):
+    '''
+    Maps each orientation to a grid of whether creating a line at that cell loses
+    a life (None for captured cells, where a line can't be created)
+    '''
+    width = len(canvas[0])
+    height = len(canvas)
+    ball_frames = ball_trajectory(balls, canvas, max_build_time)
+
+    queries = [(orientation, (x, y))
+               for orientation in ORIENTATIONS
+               for y in range(height)
+               for x in range(width)
+               if canvas[y][x] == 0]
+
+    processes = processes or os.cpu_count()
+    with Pool(processes, initializer=_start_worker, initargs=(balls, canvas, max_build_time, ball_frames, sat)) as pool:
+        verdicts = pool.map(_lose_life, queries, chunksize=max(1, len(queries) // (4 * processes)))
+
+    safety = {orientation: [[None] * width for _ in range(height)] for orientation in ORIENTATIONS}
+    for (orientation, (x, y)), lose_life in zip(queries, verdicts):
+        safety[orientation][y][x] = lose_life
+    return safety
+
+
+def print_safety_map(safety):
+    # Prints out a map for each orientation (and one for both), where
+    # # = captured, . = safe, X = loses a life, and for both: 2 = safe either way,
+    # 1 = only safe in one orientation, 0 = loses a life either way
+    symbols = {None: "#", False: ".", True: "X"}
+    for orientation in ORIENTATIONS:
+        print(f'{orientation=}')
+        for row in safety[orientation]:
+            print(" ".join(symbols[lose_life] for lose_life in row))
+        print()
+
+    print("both")
+    for row_h, row_v in zip(safety["H"], safety["V"]):
+        print(" ".join("#" if h is None else str((not h) + (not v)) for h, v in zip(row_h, row_v)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Figure out which cells are safe to create a line at with the balls and canvas from inputs.py")
+    parser.add_argument("--sat", action="store_true",
+                        help="answer each query with an incremental SAT session instead of simulating it")
+    parser.add_argument("--processes", type=int,
+                        help="number of worker processes (defaults to the number of cores)")
+    parser.add_argument("--output", metavar="FILE",
+                        help="also write the map out as JSON (null for captured cells)")
+    args = parser.parse_args()
+
+    safety = safety_map(processes=args.processes, sat=args.sat)
+    print_safety_map(safety)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(safety, f)
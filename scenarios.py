@@ -0,0 +1,262 @@
+'''
+A compact on-disk format for many scenarios, and a CLI that streams through them.
+
+inputs.py holds a single scenario as Python source, so the only way to hand
+run.py another one is to edit it. A scenario file holds any number of them as
+a NumPy .npy array of fixed-size records, which np.load() memory-maps, so the
+scenarios are read a chunk at a time without parsing anything. Each record has:
+
+  width, height   - the size of the canvas (up to 255 by 255)
+  orientation     - 0 for "H" and 1 for "V"
+  cursor          - the (x, y) of the cursor
+  max_build_time  - the horizon, or 0 for however long the line takes to be done
+  num_balls       - how many of the ball slots are used
+  balls           - (max_balls, 2) the (x, y) of each ball
+  velocities      - (max_balls, 2) the (x_vel, y_vel) of each ball, where a velocity
+                    of 0 is uncertain (None in inputs.py)
+  canvas          - the canvas, row by row, packed 8 cells to a byte (np.packbits())
+
+where max_balls and the number of canvas bytes are the same for every record in
+a file (enough for the most balls and the largest canvas in it).
+
+Evaluating a file writes a JSON line for each scenario, {"index": 7, "lose_life":
+false} (or {"index": 7, "probability": 0.25} if some of its velocities are
+uncertain), as soon as the chunk it's in is done. The scenarios in a chunk are
+grouped by canvas size and horizon and played out with batch.py, so memory
+only depends on the chunk size and not on the size of the file.
+'''
+import argparse
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from batch import Scenarios, lose_life
+from simulate import random_scenario, simulate
+
+ORIENTATIONS = ("H", "V")
+
+
+def record_dtype(max_cells, max_balls):
+    return np.dtype([("width", "u1"), ("height", "u1"), ("orientation", "u1"), ("cursor", "u1", (2,)),
+                     ("max_build_time", "u2"), ("num_balls", "u1"),
+                     ("balls", "u1", (max_balls, 2)), ("velocities", "i1", (max_balls, 2)),
+                     ("canvas", "u1", ((max_cells + 7) // 8,))])
+
+
+def velocity(vel):
+    # How a velocity is stored: its sign, or 0 if it's uncertain
+    return 0 if vel is None else 1 if vel > 0 else -1
+
+
+def pack(scenarios, dtype):
+    '''
+    Packs a list of (cursor_orientation, cursor_position, balls, canvas) scenarios (each
+    optionally followed by a max_build_time) into an array of records
+    '''
+    records = np.zeros(len(scenarios), dtype=dtype)
+    for record, (cursor_orientation, cursor_position, balls, canvas, *max_build_time) in zip(records, scenarios):
+        record["width"] = len(canvas[0])
+        record["height"] = len(canvas)
+        record["orientation"] = ORIENTATIONS.index(cursor_orientation)
+        record["cursor"] = cursor_position
+        record["max_build_time"] = (max_build_time and max_build_time[0]) or 0
+        record["num_balls"] = len(balls)
+        for b, (x, y, x_vel, y_vel) in enumerate(balls):
+            record["balls"][b] = (x, y)
+            record["velocities"][b] = (velocity(x_vel), velocity(y_vel))
+        cells = np.packbits(np.array(canvas, dtype=bool).ravel())
+        record["canvas"][:len(cells)] = cells
+    return records
+
+
+def unpack(record):
+    '''
+    The (cursor_orientation, cursor_position, balls, canvas, max_build_time) of a record,
+    in the same form as inputs.py (with None for an uncertain velocity, and for no horizon)
+    '''
+    width, height = int(record["width"]), int(record["height"])
+    num_balls = record["num_balls"]
+    balls = [(int(x), int(y), int(x_vel) or None, int(y_vel) or None)
+             for (x, y), (x_vel, y_vel) in zip(record["balls"][:num_balls], record["velocities"][:num_balls])]
+    canvas = np.unpackbits(record["canvas"], count=width * height).reshape(height, width).tolist()
+    return (ORIENTATIONS[record["orientation"]], tuple(int(c) for c in record["cursor"]), balls, canvas,
+            int(record["max_build_time"]) or None)
+
+
+def validate(index, cursor_orientation, cursor_position, balls, canvas, max_build_time=None):
+    # Raises a ValueError if a scenario doesn't fit in a record
+    width, height = len(canvas[0]), len(canvas)
+    problem = None
+    if not (0 < width <= 255 and 0 < height <= 255) or any(len(row) != width for row in canvas):
+        problem = f"its canvas is {width} by {height}, but canvases can only be up to 255 by 255 (and rectangular)"
+    elif cursor_orientation not in ORIENTATIONS:
+        problem = f"its cursor orientation is {cursor_orientation!r}"
+    elif not (0 <= cursor_position[0] < width and 0 <= cursor_position[1] < height):
+        problem = f"its cursor {tuple(cursor_position)} is off the canvas"
+    elif len(balls) > 255:
+        problem = f"it has {len(balls)} balls, but only up to 255 fit"
+    elif any(not (0 <= x < width and 0 <= y < height) for x, y, _, _ in balls):
+        problem = "one of its balls is off the canvas"
+    elif max_build_time is not None and not (0 < max_build_time <= 65535):
+        problem = f"its horizon is {max_build_time}, but it can only be from 1 to 65535"
+    if problem is not None:
+        raise ValueError(f"Scenario {index} can't be written: {problem}")
+
+
+def write(path, scenarios, chunk=4096):
+    '''
+    Writes a scenario file from scenarios, which is iterated over twice: once to check and
+    size the records (before the file is created) and once to pack them a chunk at a time,
+    straight into the memory-mapped file
+    '''
+    num_scenarios = max_cells = max_balls = 0
+    for scenario in scenarios:
+        validate(num_scenarios, *scenario)
+        _, _, balls, canvas, *_ = scenario
+        num_scenarios += 1
+        max_cells = max(max_cells, len(canvas) * len(canvas[0]))
+        max_balls = max(max_balls, len(balls))
+
+    dtype = record_dtype(max_cells, max_balls)
+    records = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(num_scenarios,))
+    pending = []
+    start = 0
+    for scenario in scenarios:
+        pending.append(scenario)
+        if len(pending) == chunk:
+            records[start:start + chunk] = pack(pending, dtype)
+            start += chunk
+            pending = []
+    records[start:] = pack(pending, dtype)
+    records.flush()
+    return num_scenarios
+
+
+def load(path):
+    # The records of a scenario file, memory-mapped (nothing is read until it's used)
+    return np.load(path, mmap_mode="r")
+
+
+class Frames:
+    '''
+    The scenarios in a file of JSON lines, in the frame format of daemon.py (re-read
+    from the file every time it's iterated over)
+    '''
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    frame = json.loads(line)
+                    yield (frame["cursor_orientation"], tuple(frame["cursor_position"]),
+                           [tuple(ball) for ball in frame["balls"]], frame["canvas"], frame.get("max_build_time"))
+
+
+class RandomScenarios:
+    '''
+    num_scenarios random scenarios (see simulate.random_scenario()), the same ones every
+    time it's iterated over
+    '''
+    def __init__(self, num_scenarios, width, height, num_balls, captured_density=0.2, seed=None):
+        self.num_scenarios = num_scenarios
+        self.args = (width, height, num_balls, captured_density)
+        self.seed = seed if seed is not None else random.randrange(2**32)
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        for _ in range(self.num_scenarios):
+            yield random_scenario(rng, *self.args)
+
+
+def evaluate(records, chunk=4096):
+    '''
+    Yields the result (see the module docstring) for each record, a chunk at a time
+    '''
+    import ddnnf
+
+    for start in range(0, len(records), chunk):
+        # Copied out of the memory-mapped file, a chunk at a time
+        block = np.array(records[start:start + chunk])
+        ball_mask = np.arange(block["balls"].shape[1]) < block["num_balls"][:, None]
+        uncertain = ((block["velocities"] == 0).any(axis=-1) & ball_mask).any(axis=1)
+        results = [None] * len(block)
+
+        # Every velocity is known, so the scenarios of each canvas size and horizon are
+        # played out together
+        groups = np.stack([block["width"], block["height"], block["max_build_time"]], axis=1)
+        for width, height, max_build_time in np.unique(groups[~uncertain], axis=0).tolist():
+            rows = np.flatnonzero((groups == (width, height, max_build_time)).all(axis=1) & ~uncertain)
+            group = block[rows]
+            canvases = np.unpackbits(group["canvas"], axis=1, count=width * height).reshape(-1, height, width)
+            scenarios = Scenarios(np.array(ORIENTATIONS)[group["orientation"]], group["cursor"].astype(np.int64),
+                                  np.concatenate([group["balls"], group["velocities"]], axis=-1).astype(np.int64),
+                                  ball_mask[rows], canvases.astype(bool))
+            for row, verdict in zip(rows, lose_life(scenarios, max_build_time or None)):
+                results[row] = {"lose_life": bool(verdict)}
+
+        # Scenarios with uncertain velocities are simulated every way they could be
+        for row in np.flatnonzero(uncertain):
+            cursor_orientation, cursor_position, balls, canvas, max_build_time = unpack(block[row])
+            results[row] = {"probability": ddnnf.simulated_probability(cursor_orientation, cursor_position, balls,
+                                                                       canvas, max_build_time=max_build_time)}
+
+        for row, result in enumerate(results):
+            yield {"index": start + row, **result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate every scenario in a scenario file, writing the results out as JSON lines")
+    parser.add_argument("file", help="the scenario file (.npy)")
+    parser.add_argument("--output", metavar="FILE", help="where to write the results (defaults to stdout)")
+    parser.add_argument("--chunk", type=int, default=4096, help="number of scenarios read in and played out at once")
+    parser.add_argument("--check", type=int, default=0, metavar="N",
+                        help="also simulate the first N scenarios one at a time, and count the ones that disagree")
+    parser.add_argument("--pack", action="store_true",
+                        help="write the scenario file instead, with the inputs from inputs.py (or --from-jsonl, or --random)")
+    parser.add_argument("--from-jsonl", metavar="FRAMES", help="with --pack, the frames (as daemon.py reads them) to write out")
+    parser.add_argument("--random", type=int, metavar="N", help="with --pack, write out N random scenarios")
+    parser.add_argument("--width", type=int, default=27)
+    parser.add_argument("--height", type=int, default=19)
+    parser.add_argument("--balls", type=int, default=4)
+    parser.add_argument("--density", type=float, default=0.2, help="chance of each cell being captured")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.pack:
+        if args.from_jsonl:
+            scenarios = Frames(args.from_jsonl)
+        elif args.random is not None:
+            scenarios = RandomScenarios(args.random, args.width, args.height, args.balls, args.density, args.seed)
+        else:
+            from inputs import CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS
+            scenarios = [(CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS)]
+        start = time.perf_counter()
+        num_scenarios = write(args.file, scenarios, args.chunk)
+        print(f"Wrote {num_scenarios} scenarios in {time.perf_counter() - start:.3f}s", file=sys.stderr)
+        sys.exit()
+
+    records = load(args.file)
+    out = open(args.output, "w") if args.output else sys.stdout
+    disagreements = 0
+    start = time.perf_counter()
+    try:
+        for result in evaluate(records, args.chunk):
+            out.write(json.dumps(result) + "\n")
+            if result["index"] < args.check and "lose_life" in result:
+                disagreements += result["lose_life"] != simulate(*unpack(records[result["index"]])).lose_life
+            # The results are flushed as each chunk is done
+            if (result["index"] + 1) % args.chunk == 0:
+                out.flush()
+    finally:
+        out.flush()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{len(records)} scenarios in {elapsed:.3f}s ({len(records) / max(elapsed, 1e-9):.0f} scenarios/s)", file=sys.stderr)
+    if args.check:
+        print(f"{disagreements} of {min(args.check, len(records))} checked scenarios disagree with the simulation", file=sys.stderr)
@@ -0,0 +1,327 @@
+'''
+A simplification pass between theory() and the solver.
+
+The inputs fix everything at time 0 with unit clauses (the captured cells, the
+balls' cells and velocities, the cursor and its builders), and since the
+dynamics are deterministic, unit propagation from them forces much of what
+comes after too. Before the clauses from a DimacsWriter are handed to kissat or
+DSHARP, simplify():
+
+  - propagates the unit clauses until nothing else is forced, fixing the
+    variables they force
+  - drops the clauses that are satisfied, and the false literals from the rest
+  - drops duplicate clauses, and clauses that a shorter clause subsumes
+  - finds the dangling variables (ones that are neither fixed nor in any clause
+    that's left), which are free, and renumbers the rest densely
+
+Variables can be frozen so that they keep an id in the simplified clauses (with
+a unit clause if they were fixed), like the inputs that a circuit is
+conditioned on or LoseLife at the horizon. Nothing else changes which
+assignments are models: a model of the simplified clauses, plus the fixed
+variables (and the dangling ones either way), is a model of the original
+clauses, so model counts only differ by a factor of 2 for each dangling variable.
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import dimacs
+import run
+
+
+def read_clauses(cnf):
+    '''
+    Reads the clauses (one per line, as a DimacsWriter writes them) from a DIMACS file
+    object, as sorted tuples without duplicate literals, leaving out tautologies
+    '''
+    clauses = []
+    for line in cnf:
+        if line[0] in "pc":
+            continue
+        literals = set(map(int, line.split()[:-1]))
+        if not any(-literal in literals for literal in literals):
+            clauses.append(tuple(sorted(literals)))
+    return clauses
+
+
+def propagate(num_vars, clauses):
+    '''
+    Unit propagation: the value of each variable (1 for true, -1 for false and 0 if it
+    isn't forced), or None if the clauses are unsatisfiable
+    '''
+    value = [0] * (num_vars + 1)
+    # The clauses each literal is in (a negative literal indexes from the end)
+    occurs = [[] for _ in range(2 * num_vars + 1)]
+    for i, clause in enumerate(clauses):
+        for literal in clause:
+            occurs[literal].append(i)
+    # How many literals of each clause aren't false yet
+    open_literals = [len(clause) for clause in clauses]
+    satisfied = bytearray(len(clauses))
+
+    if any(not clause for clause in clauses):
+        return None
+    queue = [clause[0] for clause in clauses if len(clause) == 1]
+    while queue:
+        literal = queue.pop()
+        if value[abs(literal)]:
+            if (value[abs(literal)] > 0) != (literal > 0):
+                return None
+            continue
+        value[abs(literal)] = 1 if literal > 0 else -1
+
+        for i in occurs[literal]:
+            satisfied[i] = 1
+        for i in occurs[-literal]:
+            if satisfied[i]:
+                continue
+            open_literals[i] -= 1
+            if open_literals[i] == 0:
+                return None
+            if open_literals[i] == 1:
+                queue.extend(other for other in clauses[i] if not value[abs(other)])
+    return value
+
+
+def subsume(clauses):
+    '''
+    The clauses without duplicates and without the ones that a shorter clause subsumes
+    (the rest stay in the same order, which DSHARP's heuristics are sensitive to)
+    '''
+    clauses = list(dict.fromkeys(clauses))
+    sets = [frozenset(clause) for clause in clauses]
+    occurs = {}
+    for i, clause in enumerate(clauses):
+        for literal in clause:
+            occurs.setdefault(literal, []).append(i)
+
+    removed = bytearray(len(clauses))
+    for i in sorted(range(len(clauses)), key=lambda i: len(clauses[i])):
+        clause = clauses[i]
+        if removed[i]:
+            continue
+        # Any clause that this one subsumes has its least common literal
+        for j in occurs[min(clause, key=lambda literal: len(occurs[literal]))]:
+            if j != i and not removed[j] and len(clauses[j]) > len(clause) and sets[i] <= sets[j]:
+                removed[j] = 1
+    return [clause for i, clause in enumerate(clauses) if not removed[i]]
+
+
+class Simplified:
+    '''
+    Simplified clauses over dense ids, where variables[i - 1] is the original id of
+    variable i. fixed holds the original ids (of variables that aren't frozen) that
+    unit propagation fixed, with their values, and dangling the ones that were left free.
+    '''
+    def __init__(self, num_vars, clauses, variables, fixed, dangling, stats):
+        self.num_vars = num_vars
+        self.clauses = clauses
+        self.variables = variables
+        self.fixed = fixed
+        self.dangling = dangling
+        self.stats = stats
+
+    def unsatisfiable(self):
+        return self.clauses == [()]
+
+    def ids(self, ids):
+        # Maps {proposition: original id} to {proposition: id} for the variables that are left
+        new_ids = {old: new for new, old in enumerate(self.variables, start=1)}
+        return {prop: new_ids[i] for prop, i in ids.items() if i in new_ids}
+
+    def write(self, out):
+        out.write(f"p cnf {self.num_vars} {len(self.clauses)}\n")
+        for clause in self.clauses:
+            out.write(" ".join(map(str, clause)) + " 0\n")
+        out.flush()
+
+    def write_variables(self, out, ids):
+        # The variable map (see dimacs.py) of the variables that are left
+        for prop, i in self.ids(ids).items():
+            out.write(json.dumps([i, *prop._key]) + "\n")
+
+    def complete(self, solution, props):
+        '''
+        Adds the fixed and dangling variables (a dangling variable could be either way, so
+        it's false) to a {proposition: value} solution, where props is {original id: proposition}
+        '''
+        solution.update((props[i], value) for i, value in self.fixed.items() if i in props)
+        solution.update((props[i], False) for i in self.dangling if i in props)
+        return solution
+
+
+def simplify(num_vars, clauses, frozen=()):
+    '''
+    Simplifies clauses over variables 1 to num_vars (see the module docstring). The
+    frozen variable ids are kept, even if they're fixed or dangling.
+    '''
+    frozen = set(frozen)
+    stats = {"variables": num_vars, "clauses": len(clauses)}
+
+    value = propagate(num_vars, clauses)
+    if value is None:
+        # Unsatisfiable, which the empty clause says just as well
+        stats.update(fixed=0, satisfied=len(clauses), subsumed=0, dangling=0,
+                     simplified_variables=0, simplified_clauses=1)
+        return Simplified(0, [()], [], {}, [], stats)
+
+    left = []
+    for clause in clauses:
+        if not any(value[abs(literal)] == (1 if literal > 0 else -1) for literal in clause):
+            left.append(tuple(literal for literal in clause if not value[abs(literal)]))
+    stats["fixed"] = sum(1 for v in value[1:] if v)
+    stats["satisfied"] = len(clauses) - len(left)
+
+    simplified = subsume(left)
+    stats["subsumed"] = len(left) - len(simplified)
+
+    occurring = {abs(literal) for clause in simplified for literal in clause}
+    dangling = [i for i in range(1, num_vars + 1) if not value[i] and i not in occurring and i not in frozen]
+    stats["dangling"] = len(dangling)
+
+    variables = [i for i in range(1, num_vars + 1) if i in occurring or i in frozen]
+    new_ids = {old: new for new, old in enumerate(variables, start=1)}
+    simplified = [tuple(new_ids[literal] if literal > 0 else -new_ids[-literal] for literal in clause)
+                  for clause in simplified]
+    # Frozen variables that were fixed keep their value as a unit clause
+    simplified += [(new_ids[i] if value[i] > 0 else -new_ids[i],) for i in sorted(frozen) if value[i]]
+    fixed = {i: value[i] > 0 for i in range(1, num_vars + 1) if value[i] and i not in frozen}
+
+    stats["simplified_variables"] = len(variables)
+    stats["simplified_clauses"] = len(simplified)
+    return Simplified(len(variables), simplified, variables, fixed, dangling, stats)
+
+
+def simplify_writer(writer, frozen=()):
+    '''
+    Simplifies the clauses that a DimacsWriter has spooled, where frozen are propositions
+    '''
+    writer.spool.seek(0)
+    clauses = read_clauses(writer.spool)
+    return simplify(writer.num_vars, clauses, [writer.ids[prop] for prop in frozen if prop in writer.ids])
+
+
+def dangling_report(simplified, props):
+    # How many dangling variables there are of each kind of proposition (None for auxiliary variables)
+    return Counter(props[i]._key[0] if i in props else None for i in simplified.dangling)
+
+
+def solve(simplified, props):
+    '''
+    Solves the simplified clauses with kissat, returning {proposition: value} (or None if
+    they're unsatisfiable), where props is {original id: proposition}
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        cnf_path = os.path.join(directory, "simplified.cnf")
+        with open(cnf_path, "w") as cnf:
+            simplified.write(cnf)
+        solution = dimacs.solve(cnf_path, {new: props[old] for new, old in enumerate(simplified.variables, start=1)
+                                           if old in props})
+    if solution is None:
+        return None
+    return simplified.complete(solution, props)
+
+
+def encode(pruned=False):
+    # Streams theory() for the configured inputs into a DimacsWriter
+    writer = dimacs.DimacsWriter()
+    run.DIMACS_WRITER = writer
+    try:
+        run.theory(pruned)
+    finally:
+        run.DIMACS_WRITER = None
+    return writer
+
+
+def lose_life(pruned=False):
+    '''
+    Whether creating the line loses a life with the configured inputs, by solving the
+    simplified encoding with kissat (or None if the inputs contradict the theory)
+    '''
+    verdict = run.LoseLife(run.MAX_BUILD_TIME - 1)
+    writer = encode(pruned)
+    simplified = simplify_writer(writer, [verdict])
+    writer.close()
+    solution = solve(simplified, {i: prop for prop, i in writer.ids.items()})
+    return None if solution is None else solution[verdict]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simplify the encoding with the inputs from inputs.py before handing it to a solver")
+    parser.add_argument("--pruned", action="store_true",
+                        help="only encode the states that are reachable from the inputs")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write the simplified DIMACS file (and its variable map to FILE.vars)")
+    parser.add_argument("--solve", action="store_true",
+                        help="solve the encoding with kissat before and after simplifying it, and compare them")
+    parser.add_argument("--queries", type=int,
+                        help="instead, check the simplified encoding against the simulation on this many random scenarios")
+    parser.add_argument("--width", type=int, default=6)
+    parser.add_argument("--height", type=int, default=6)
+    parser.add_argument("--balls", type=int, default=2)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.queries is not None:
+        from simulate import random_scenario, simulate
+
+        rng = random.Random(args.seed)
+        disagreements = 0
+        start = time.perf_counter()
+        for _ in range(args.queries):
+            scenario = random_scenario(rng, args.width, args.height, args.balls)
+            run.configure(*scenario)
+            disagreements += lose_life(args.pruned) != simulate(*scenario).lose_life
+        print(f"{args.queries} scenarios in {time.perf_counter() - start:.3f}s")
+        print(f"{disagreements} of {args.queries} scenarios disagree with the simulation")
+        sys.exit()
+
+    verdict = run.LoseLife(run.MAX_BUILD_TIME - 1)
+    start = time.perf_counter()
+    writer = encode(args.pruned)
+    encoding = time.perf_counter() - start
+    start = time.perf_counter()
+    simplified = simplify_writer(writer, [verdict])
+    simplifying = time.perf_counter() - start
+
+    stats = simplified.stats
+    print(f"Encoded {stats['variables']} variables and {stats['clauses']} clauses in {encoding:.3f}s")
+    print(f"Simplified to {stats['simplified_variables']} variables and {stats['simplified_clauses']} clauses in {simplifying:.3f}s")
+    print(f"  {stats['fixed']} variables fixed, {stats['dangling']} dangling")
+    print(f"  {stats['satisfied']} clauses satisfied, {stats['subsumed']} subsumed")
+    props = {i: prop for prop, i in writer.ids.items()}
+    for name, count in dangling_report(simplified, props).most_common():
+        print(f"  {count} dangling {name or 'auxiliary'} variables")
+
+    if args.output:
+        with open(args.output, "w") as cnf:
+            simplified.write(cnf)
+        with open(args.output + ".vars", "w") as variables:
+            simplified.write_variables(variables, writer.ids)
+
+    if args.solve:
+        with tempfile.TemporaryDirectory() as directory:
+            cnf_path = os.path.join(directory, "theory.cnf")
+            with open(cnf_path, "w") as cnf:
+                writer.write(cnf)
+            start = time.perf_counter()
+            original = dimacs.solve(cnf_path, props)
+            print(f"Solved the original encoding in {time.perf_counter() - start:.3f}s")
+        start = time.perf_counter()
+        solution = solve(simplified, props)
+        print(f"Solved the simplified encoding in {time.perf_counter() - start:.3f}s")
+
+        if (original is None) != (solution is None) or (solution is not None and original[verdict] != solution[verdict]):
+            print("The simplified encoding disagrees with the original one")
+        elif solution is None:
+            print("The inputs contradict the theory")
+        elif solution[verdict]:
+            print("You will lose a life if you create the line")
+        else:
+            print("You won't lose a life if you create the line")
+    writer.close()
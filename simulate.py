@@ -0,0 +1,369 @@
+'''
+A solver-free forward simulation of the JezzBall model in run.py.
+
+Every input in inputs.py is fully determined, so instead of encoding the whole
+timeline as propositions and handing it to a SAT solver, we can just step the
+balls, builders and captured cells forward in time using the same rules that
+dynamics(), ball_movement(), ball_bouncing() and explore_builders() describe.
+
+The cross-validation mode runs both paths on random scenarios and reports any
+scenario where the encoding disagrees with the simulation.
+'''
+import argparse
+import random
+
+from inputs import CURSOR_ORIENTATION, CURSOR_POSITION, BALLS, CANVAS
+
+DIRECTIONS = ("N", "E", "S", "W")
+
+# How a builder of each direction moves after a step in time
+BUILDER_STEPS = {"N": (0, -1), "E": (1, 0), "S": (0, 1), "W": (-1, 0)}
+
+# Which builders are created for each cursor orientation
+ORIENTATION_BUILDERS = {"H": ("E", "W"), "V": ("N", "S")}
+
+
+class Frame:
+    '''
+    The state of the canvas at time t:
+      captured  - set of captured (x, y) cells
+      building  - the cells currently being built by each builder direction
+      builders  - the cell each builder is at (only for builders that are still building)
+      finished  - the builder directions that have finished building
+      balls     - (x, y, x_vel, y_vel) of each ball, where the velocity is the one it moves with at time t
+      lose_life - whether the player will have lost a life by time t
+    '''
+    def __init__(self, time, captured, building, builders, finished, balls, lose_life):
+        self.time = time
+        self.captured = captured
+        self.building = building
+        self.builders = builders
+        self.finished = finished
+        self.balls = balls
+        self.lose_life = lose_life
+
+    def building_cells(self):
+        return {cell for cells in self.building.values() for cell in cells}
+
+
+class Simulation:
+    '''
+    The result of simulating the creation of a line: whether a life was lost,
+    and the frame at every time step up to (but not including) the horizon
+    '''
+    def __init__(self, width, height, frames):
+        self.width = width
+        self.height = height
+        self.frames = frames
+
+    @property
+    def lose_life(self):
+        return self.frames[-1].lose_life
+
+
+def line_horizon(cursor_orientation, cursor_position, canvas):
+    '''
+    How many time steps it takes for creating a line to play out. Each builder runs
+    one cell per step until it reaches a captured cell or the canvas border, and
+    finishes a step after its last cell. Its building cells can still be hit at that
+    step (which is counted a step later), and are captured after it.
+    '''
+    width = len(canvas[0])
+    height = len(canvas)
+
+    run_lengths = []
+    for d in ORIENTATION_BUILDERS[cursor_orientation]:
+        dx, dy = BUILDER_STEPS[d]
+        x, y = cursor_position
+        length = 1
+        while 0 <= x + dx < width and 0 <= y + dy < height and canvas[y + dy][x + dx] == 0:
+            x, y = x + dx, y + dy
+            length += 1
+        run_lengths.append(length)
+    return max(run_lengths) + 2
+
+
+def longest_horizon(width, height):
+    '''
+    The horizon that is long enough for any line on a canvas of this size
+    '''
+    return max(width, height) + 2
+
+
+def step_ball(ball_state, stuck, blocked):
+    '''
+    Moves a ball forward a step in time, returning its new (x, y, x_vel, y_vel) and
+    whether it stayed where it was. blocked(x, y) says whether a cell is captured
+    (or past the canvas border) after the step.
+    '''
+    x, y, x_vel, y_vel = ball_state
+
+    # Balls move diagonally to the next cell if that cell isn't captured, and
+    # then bounce off of any captured cell (or canvas border) they're moving towards
+    if blocked(x + x_vel, y + y_vel):
+        moved = False
+    else:
+        x, y = x + x_vel, y + y_vel
+        moved = True
+
+    bounce_x = blocked(x + x_vel, y)
+    bounce_y = blocked(x, y + y_vel)
+    if bounce_x:
+        x_vel = -x_vel
+    if bounce_y:
+        y_vel = -y_vel
+
+    # A ball that hit a corner head on (and nothing else) bounces straight back
+    if stuck and not (bounce_x or bounce_y):
+        x_vel, y_vel = -x_vel, -y_vel
+
+    return (x, y, x_vel, y_vel), not moved
+
+
+def check_velocities(balls):
+    # Only the chance of losing a life can be worked out when a velocity is uncertain (None)
+    if any(x_vel is None or y_vel is None for _, _, x_vel, y_vel in balls):
+        raise ValueError("Some velocities are uncertain (None), so only the chance of losing a life can be "
+                         "worked out (see run.py --likelihood and ddnnf.simulated_probability())")
+
+
+def ball_trajectory(balls=BALLS, canvas=CANVAS, max_build_time=None):
+    '''
+    The (x, y, x_vel, y_vel) of each ball at every time step if no line is created
+    (by default, for long enough to be shared by any line on the canvas)
+    '''
+    check_velocities(balls)
+    width = len(canvas[0])
+    height = len(canvas)
+    if max_build_time is None:
+        max_build_time = longest_horizon(width, height)
+
+    def blocked(x, y):
+        return not (0 <= x < width and 0 <= y < height) or canvas[y][x] == 1
+
+    ball_states = [(x, y, 1 if x_vel > 0 else -1, 1 if y_vel > 0 else -1) for x, y, x_vel, y_vel in balls]
+    stuck = [False] * len(ball_states)
+    trajectory = [ball_states]
+    for t in range(max_build_time - 1):
+        steps = [step_ball(ball_state, stuck[i], blocked) for i, ball_state in enumerate(ball_states)]
+        ball_states = [ball_state for ball_state, _ in steps]
+        stuck = [ball_stuck for _, ball_stuck in steps]
+        trajectory.append(ball_states)
+    return trajectory
+
+
+# With ball_frames from ball_trajectory(), the balls aren't stepped forward again until
+# part of the line is captured (before then, they don't notice the line at all)
+def simulate(cursor_orientation=CURSOR_ORIENTATION, cursor_position=CURSOR_POSITION, balls=BALLS,
+             canvas=CANVAS, max_build_time=None, ball_frames=None):
+    check_velocities(balls)
+    width = len(canvas[0])
+    height = len(canvas)
+    if max_build_time is None:
+        max_build_time = line_horizon(cursor_orientation, cursor_position, canvas)
+
+    # A cell is blocked if it is captured or past the canvas border
+    def blocked(x, y, captured):
+        return not (0 <= x < width and 0 <= y < height) or (x, y) in captured
+
+    captured = frozenset((x, y) for y in range(height) for x in range(width) if canvas[y][x] == 1)
+
+    # Initialize builders with their position and orientation based of off the input
+    x, y = cursor_position
+    directions = ORIENTATION_BUILDERS[cursor_orientation]
+    builders = {d: (x, y) for d in directions}
+    building = {d: ((x, y),) for d in directions}
+    finished = frozenset()
+
+    # Initialize balls and ball velocities (velocities only matter by their sign)
+    ball_states = [(x, y, 1 if x_vel > 0 else -1, 1 if y_vel > 0 else -1) for x, y, x_vel, y_vel in balls]
+    stuck = [False] * len(ball_states)
+
+    lose_life = False
+    frames = [Frame(0, captured, building, builders, finished, ball_states, lose_life)]
+
+    for t in range(max_build_time - 1):
+        # When a ball collides with a building cell, the player loses a life
+        if not lose_life:
+            building_cells = frames[-1].building_cells()
+            lose_life = any((x, y) in building_cells for x, y, _, _ in ball_states)
+
+        # A building cell turns into a captured cell once its builder is done
+        next_captured = captured
+        for d in finished:
+            next_captured = next_captured.union(building[d])
+
+        # A builder creates a building cell and moves to the next cell, or finishes
+        # building if it runs into a captured cell or the canvas border
+        next_builders = {}
+        next_building = {}
+        next_finished = set(finished)
+        for d in directions:
+            if d in finished:
+                next_building[d] = ()
+                continue
+
+            next_building[d] = building[d]
+            if d in builders:
+                dx, dy = BUILDER_STEPS[d]
+                x, y = builders[d]
+                if blocked(x + dx, y + dy, captured):
+                    next_finished.add(d)
+                else:
+                    next_builders[d] = (x + dx, y + dy)
+                    next_building[d] = building[d] + ((x + dx, y + dy),)
+
+        if ball_frames is not None and not finished:
+            next_ball_states = ball_frames[t + 1]
+            stuck = [next_ball[:2] == ball[:2] for ball, next_ball in zip(ball_states, next_ball_states)]
+        else:
+            steps = [step_ball(ball_state, stuck[i], lambda x, y: blocked(x, y, next_captured))
+                     for i, ball_state in enumerate(ball_states)]
+            next_ball_states = [ball_state for ball_state, _ in steps]
+            stuck = [ball_stuck for _, ball_stuck in steps]
+
+        captured = next_captured
+        builders = next_builders
+        building = next_building
+        finished = frozenset(next_finished)
+        ball_states = next_ball_states
+        frames.append(Frame(t + 1, captured, building, builders, finished, ball_states, lose_life))
+
+    return Simulation(width, height, frames)
+
+
+########## CROSS-VALIDATION ##########
+
+def random_scenario(rng, width, height, num_balls, captured_density=0.2):
+    '''
+    A random (cursor_orientation, cursor_position, balls, canvas) scenario, with the
+    cursor and the balls on empty cells
+    '''
+    canvas = [[int(rng.random() < captured_density) for _ in range(width)] for _ in range(height)]
+    empty = [(x, y) for y in range(height) for x in range(width) if canvas[y][x] == 0]
+    if len(empty) < num_balls + 1:
+        return random_scenario(rng, width, height, num_balls, captured_density)
+
+    cells = rng.sample(empty, num_balls + 1)
+    balls = [(x, y, rng.choice((-1, 1)), rng.choice((-1, 1))) for x, y in cells[1:]]
+    return rng.choice(("H", "V")), cells[0], balls, canvas
+
+
+def trajectory_literals(simulation, num_balls):
+    '''
+    The simulated timeline written as (nnf) literals over the propositions of run.py
+    '''
+    import run
+
+    def literal(prop, value):
+        return prop._var if value else ~prop._var
+
+    width, height = simulation.width, simulation.height
+    literals = []
+    previous = None
+    for frame in simulation.frames:
+        t = frame.time
+        for y in range(height):
+            for x in range(width):
+                literals.append(literal(run.CapturedCell(x, y, t), (x, y) in frame.captured))
+                for d in DIRECTIONS:
+                    literals.append(literal(run.BuildingCell(d, x, y, t), (x, y) in frame.building.get(d, ())))
+                    literals.append(literal(run.Builder(d, x, y, t), frame.builders.get(d) == (x, y)))
+                for b in range(num_balls):
+                    literals.append(literal(run.BallPosition(b, x, y, t), frame.balls[b][:2] == (x, y)))
+
+        for d in DIRECTIONS:
+            literals.append(literal(run.BuilderFinished(d, t), d in frame.finished))
+        for b in range(num_balls):
+            _, _, x_vel, y_vel = frame.balls[b]
+            literals.append(literal(run.BallVelocityX(b, t), x_vel > 0))
+            literals.append(literal(run.BallVelocityY(b, t), y_vel > 0))
+            literals.append(literal(run.BallStuck(b, t), previous is not None and previous.balls[b][:2] == frame.balls[b][:2]))
+        previous = frame
+
+    return literals
+
+
+def check_against_encoding(cursor_orientation, cursor_position, balls, canvas, max_build_time=None, pruned=False):
+    '''
+    Runs both the simulation and the SAT encoding on a scenario, returning a
+    description of the disagreement (or None if they agree).
+
+    The encoding agrees with the simulation if the simulated timeline is a model
+    of the theory, and if the inputs alone force the same lose life verdict.
+    '''
+    import run
+    from nnf import And, Or, kissat
+
+    simulation = simulate(cursor_orientation, cursor_position, balls, canvas, max_build_time)
+
+    run.configure(cursor_orientation, cursor_position, balls, canvas, max_build_time)
+    T = run.theory(pruned).compile().to_CNF()
+
+    # Whether the theory is satisfiable with the literals added as unit clauses
+    def satisfiable_with(literals):
+        return kissat.solve(And(T.children | {Or({literal}) for literal in literals})) is not None
+
+    trajectory = trajectory_literals(simulation, len(balls))
+    if not satisfiable_with(trajectory):
+        return "the encoding rejects the simulated timeline"
+
+    verdict = run.LoseLife(run.MAX_BUILD_TIME - 1)._var
+    wrong_verdict = ~verdict if simulation.lose_life else verdict
+    if satisfiable_with([wrong_verdict]):
+        return f"the encoding allows lose_life={not simulation.lose_life} but the simulation says {simulation.lose_life}"
+
+    return None
+
+
+def cross_validate(trials, width=4, height=4, num_balls=1, captured_density=0.2, seed=None, pruned=False):
+    '''
+    Checks the simulation against the SAT encoding on random scenarios, returning
+    a list of (scenario, disagreement) for every scenario where they disagree
+    '''
+    rng = random.Random(seed)
+    disagreements = []
+    for _ in range(trials):
+        scenario = random_scenario(rng, width, height, num_balls, captured_density)
+        problem = check_against_encoding(*scenario, pruned=pruned)
+        if problem is not None:
+            disagreements.append((scenario, problem))
+    return disagreements
+
+
+def print_simulation(simulation):
+    # Prints out a mapping of the canvas for each step in time, the same way as a solution
+    from timeline import from_simulation, render
+    print(render(from_simulation(simulation, len(simulation.frames[0].balls))))
+
+    # Prints out the result of whether or not the player will lose a life
+    if simulation.lose_life:
+        print("You will lose a life if you create the line")
+    else:
+        print("You won't lose a life if you create the line")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate creating a line with the inputs from inputs.py")
+    parser.add_argument("--cross-validate", type=int, metavar="TRIALS",
+                        help="check the simulation against the SAT encoding on random scenarios instead")
+    parser.add_argument("--width", type=int, default=4)
+    parser.add_argument("--height", type=int, default=4)
+    parser.add_argument("--balls", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--pruned", action="store_true", help="cross-validate the reachability-pruned encoding")
+    args = parser.parse_args()
+
+    if args.cross_validate is None:
+        if any(x_vel is None or y_vel is None for _, _, x_vel, y_vel in BALLS):
+            parser.error("some velocities in inputs.py are uncertain (None), so use run.py --likelihood instead")
+        print_simulation(simulate())
+    else:
+        disagreements = cross_validate(args.cross_validate, args.width, args.height, args.balls,
+                                       seed=args.seed, pruned=args.pruned)
+        for (cursor_orientation, cursor_position, balls, canvas), problem in disagreements:
+            print(f"{cursor_orientation=} {cursor_position=} {balls=}")
+            print(*canvas, sep='\n')
+            print(problem)
+            print()
+        print(f"{len(disagreements)} of {args.cross_validate} scenarios disagree")
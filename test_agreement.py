@@ -0,0 +1,63 @@
+'''
+Checks that the ways of working out whether a line loses a life all agree with
+the simulation, on small random canvases so that they run in a few seconds.
+
+    python3 -m pytest test_agreement.py
+'''
+import random
+
+import pytest
+
+import batch
+import incremental
+import scenarios
+from simulate import cross_validate, random_scenario, simulate
+
+SEED = 2024
+WIDTH, HEIGHT = 4, 4
+
+
+def random_scenarios(count, num_balls, seed=SEED, width=WIDTH, height=HEIGHT):
+    rng = random.Random(seed)
+    return [random_scenario(rng, width, height, num_balls) for _ in range(count)]
+
+
+def test_simulation_matches_encoding():
+    disagreements = cross_validate(4, WIDTH, HEIGHT, num_balls=1, seed=SEED)
+    assert not disagreements, "The simulation and the encoding disagree on %r" % (disagreements,)
+
+
+@pytest.mark.parametrize("max_build_time", [None, 1, 3])
+def test_batch_matches_simulate(max_build_time):
+    cases = random_scenarios(200, num_balls=2, width=5, height=5)
+    verdicts = batch.lose_life(batch.Scenarios.from_lists(cases), max_build_time)
+    for scenario, verdict in zip(cases, verdicts):
+        assert bool(verdict) == simulate(*scenario, max_build_time).lose_life, "Disagreement on %r" % (scenario,)
+
+
+def test_incremental_matches_simulate():
+    rng = random.Random(SEED)
+    with incremental.Session(WIDTH, HEIGHT, 1) as session:
+        for scenario in random_scenarios(30, num_balls=1):
+            max_build_time = rng.choice([None, rng.randint(1, session.max_build_time)])
+            verdict = session.lose_life(*scenario, max_build_time=max_build_time)
+            assert verdict == simulate(*scenario, max_build_time).lose_life, \
+                "Disagreement on %r with a horizon of %r" % (scenario, max_build_time)
+
+
+def test_scenario_file_matches_simulate(tmp_path):
+    cases = random_scenarios(100, num_balls=2)
+    path = str(tmp_path / "scenarios.npy")
+    assert scenarios.write(path, cases, chunk=32) == len(cases)
+
+    records = scenarios.load(path)
+    for result, scenario in zip(scenarios.evaluate(records, chunk=32), cases):
+        assert scenarios.unpack(records[result["index"]])[:4] == scenario
+        assert result["lose_life"] == simulate(*scenario).lose_life, "Disagreement on %r" % (scenario,)
+
+
+def test_uncertain_velocities_are_rejected():
+    cursor_orientation, cursor_position, balls, canvas = random_scenarios(1, num_balls=1)[0]
+    x, y, _, y_vel = balls[0]
+    with pytest.raises(ValueError):
+        simulate(cursor_orientation, cursor_position, [(x, y, None, y_vel)], canvas)
@@ -0,0 +1,191 @@
+'''
+Bulk decoding of solutions into NumPy arrays.
+
+A solution maps every proposition of run.py to its value, and reading a
+timeline back out of it one proposition (and one string) at a time is slow for
+long horizons or big canvases. A TimelineIndex lays out the propositions of the
+configured inputs once, in the order of the arrays they decode into, so that a
+solution is decoded in one pass and then just reshaped (a model of integer
+literals, from PySAT or a DIMACS solver, is decoded with a single NumPy gather):
+
+  captured  - (T, H, W) whether each cell is captured at time t
+  building  - (D, T, H, W) whether each cell is being built by the builder of each direction
+  builders  - (D, T, H, W) where the builder of each direction is
+  balls     - (B, T, H, W) where each ball is
+  lose_life - (T,) whether the player will have lost a life by time t
+
+Timelines can be saved to (and loaded from) compressed .npz files.
+'''
+from itertools import repeat
+
+import numpy as np
+
+from simulate import DIRECTIONS
+
+ARRAYS = ("captured", "building", "builders", "balls", "lose_life")
+
+
+class Timeline:
+    '''
+    The arrays that a solution (or a simulation) decodes into, see the module docstring
+    '''
+    def __init__(self, captured, building, builders, balls, lose_life):
+        self.captured = captured
+        self.building = building
+        self.builders = builders
+        self.balls = balls
+        self.lose_life = lose_life
+
+    def canvas_maps(self):
+        '''
+        The canvas at each step in time as a (T, H, W) array of 0 (empty), 1 (captured) and 2 (being built)
+        '''
+        maps = self.captured.astype(np.int8)
+        maps[self.building.any(axis=0)] = 2
+        return maps
+
+    def ball_positions(self):
+        '''
+        The (x, y) of each ball at each step in time, as a (B, T, 2) array
+        '''
+        num_balls, horizon, height, width = self.balls.shape
+        cells = self.balls.reshape(num_balls, horizon, height * width).argmax(axis=-1)
+        return np.stack([cells % width, cells // width], axis=-1)
+
+    def save(self, path):
+        np.savez_compressed(path, **{name: getattr(self, name) for name in ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(**{name: arrays[name] for name in ARRAYS})
+
+
+class TimelineIndex:
+    '''
+    The propositions for the inputs run.py is configured with, in the order of the arrays
+    they decode into. Propositions that are missing from a solution (the pruned encoding
+    leaves out the ones it knows ahead of time) take their value from the inputs.
+
+    When run.py is run as a script, its propositions live in __main__ instead of run,
+    so it passes itself in as the module to take them from.
+    '''
+    def __init__(self, run=None):
+        if run is None:
+            import run
+
+        horizon = run.MAX_BUILD_TIME
+        height = run.CANV_CELLS_HEIGHT
+        width = run.CANV_CELLS_WIDTH
+        num_balls = len(run.BALLS)
+        cells = [(x, y) for y in range(height) for x in range(width)]
+        times = range(horizon)
+
+        self.props = []
+        self.defaults = []
+
+        def layout(props, defaults):
+            self.props.extend(props)
+            self.defaults.extend(defaults)
+
+        layout([run.CapturedCell(x, y, t) for t in times for x, y in cells],
+               [run.CANVAS[y][x] == 1 for t in times for x, y in cells])
+        for proposition in (run.BuildingCell, run.Builder):
+            layout([proposition(d, x, y, t) for d in run.DIRECTIONS for t in times for x, y in cells],
+                   [False] * (len(run.DIRECTIONS) * horizon * len(cells)))
+        layout([run.BallPosition(b, x, y, t) for b in range(num_balls) for t in times for x, y in cells],
+               [False] * (num_balls * horizon * len(cells)))
+        layout([run.LoseLife(t) for t in times], [False] * horizon)
+
+        self.shapes = [(horizon, height, width),
+                       (len(run.DIRECTIONS), horizon, height, width),
+                       (len(run.DIRECTIONS), horizon, height, width),
+                       (num_balls, horizon, height, width),
+                       (horizon,)]
+        self.defaults = np.array(self.defaults, dtype=bool)
+
+        # Propositions are interned (see run.interned()), so the solution has the very same
+        # objects as keys, and they can be looked up by identity without hashing them
+        self.positions = {id(prop): i for i, prop in enumerate(self.props)}
+
+    def arrays(self, values):
+        # Splits the values (in the order of self.props) up into the timeline's arrays
+        arrays = []
+        start = 0
+        for shape in self.shapes:
+            size = int(np.prod(shape))
+            arrays.append(values[start:start + size].reshape(shape))
+            start += size
+        return Timeline(*arrays)
+
+    def decode(self, solution):
+        '''
+        Decodes a {proposition: value} solution (from bauhaus, nnf or dimacs.solve())
+        '''
+        positions = np.fromiter(map(self.positions.get, map(id, solution.keys()), repeat(-1)),
+                                dtype=np.int64, count=len(solution))
+        solved = np.fromiter(solution.values(), dtype=bool, count=len(solution))
+        known = positions >= 0
+
+        values = self.defaults.copy()
+        values[positions[known]] = solved[known]
+        return self.arrays(values)
+
+    def variables(self, ids):
+        '''
+        The variable id of each proposition (or 0 if it doesn't have one), where ids maps
+        propositions to variable ids. This only has to be worked out once for every model
+        over the same variables.
+        '''
+        return np.fromiter(map(ids.get, self.props, repeat(0)), dtype=np.int64, count=len(self.props))
+
+    def decode_model(self, model, variables):
+        '''
+        Decodes a model given as a list of integer literals (the literal for variable i at
+        index i-1, like PySAT's), with variables from self.variables()
+        '''
+        model = np.asarray(model)
+        known = (variables > 0) & (variables <= len(model))
+        values = np.where(known, model[np.where(known, variables, 1) - 1] > 0, self.defaults)
+        return self.arrays(values)
+
+
+def from_simulation(simulation, num_balls):
+    '''
+    The timeline of a simulate.Simulation
+    '''
+    horizon = len(simulation.frames)
+    height, width = simulation.height, simulation.width
+    directions = {d: i for i, d in enumerate(DIRECTIONS)}
+
+    captured = np.zeros((horizon, height, width), dtype=bool)
+    building = np.zeros((len(directions), horizon, height, width), dtype=bool)
+    builders = np.zeros((len(directions), horizon, height, width), dtype=bool)
+    balls = np.zeros((num_balls, horizon, height, width), dtype=bool)
+    lose_life = np.zeros(horizon, dtype=bool)
+
+    for t, frame in enumerate(simulation.frames):
+        for x, y in frame.captured:
+            captured[t, y, x] = True
+        for d, cells in frame.building.items():
+            for x, y in cells:
+                building[directions[d], t, y, x] = True
+        for d, (x, y) in frame.builders.items():
+            builders[directions[d], t, y, x] = True
+        for b, (x, y, _, _) in enumerate(frame.balls):
+            balls[b, t, y, x] = True
+        lose_life[t] = frame.lose_life
+
+    return Timeline(captured, building, builders, balls, lose_life)
+
+
+def render(timeline):
+    '''
+    Prints out a mapping of the canvas for each step in time (1 = captured, 2 = being built)
+    '''
+    lines = []
+    for t, canvas_map in enumerate(timeline.canvas_maps()):
+        lines.append(f't={t}')
+        lines.extend(str(row) for row in canvas_map.tolist())
+        lines.append('')
+    return "\n".join(lines)